@@ -1,18 +1,71 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query
+from typing import List, Optional
 import os
 import subprocess
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, StreamingResponse
+
+from data_layer import get_filter
+from export import EXPORT_FORMATS, export_filename, iter_export
+from pdf_cache import router as pdf_router
+from sentiment_stats import cached_statistics, make_filter_key
 
 app = FastAPI()
 
+# Cached, range-capable proxy for the report PDFs: GET /pdfs/report?url=<pdf_link>
+app.include_router(pdf_router, prefix="/pdfs")
+
+def filter_selection(years: Optional[List[str]] = Query(None),
+                     countries: Optional[List[str]] = Query(None),
+                     companies: Optional[List[str]] = Query(None),
+                     inspection_types: Optional[List[str]] = Query(None),
+                     firms: Optional[List[str]] = Query(None),
+                     firm_ids: Optional[List[str]] = Query(None)):
+    # Query parameters shared by the endpoints that work on a filter selection
+    return {
+        'Inspection Year': years,
+        'Country': countries,
+        'Company': companies,
+        'Inspection Type': inspection_types,
+        'Inspection Report Company': firms,
+        'Firm ID': firm_ids,
+    }
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
+@app.get("/statistics")
+def read_statistics(selection: dict = Depends(filter_selection),
+                    n_resamples: int = Query(2000, ge=100, le=20000),
+                    confidence: float = Query(0.95, gt=0, lt=1)):
+    # Sentiment vs. deficiency rate correlations and per-company trends for the selection
+    data_filter = get_filter()
+    df_filtered = data_filter.apply(isin=selection)
+    filter_key = make_filter_key('api', *(sorted(values or []) for values in selection.values()))
+    return cached_statistics(filter_key, df_filtered, data_filter.data_token, n_resamples=n_resamples, confidence=confidence)
+
+@app.get("/export")
+def export_data(selection: dict = Depends(filter_selection),
+                format: str = Query('csv'),
+                columns: Optional[List[str]] = Query(None)):
+    # Stream the selected rows in chunks as CSV, Parquet or Arrow IPC
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+    data_filter = get_filter()
+    unknown_columns = set(columns or []) - set(data_filter.df.columns)
+    if unknown_columns:
+        raise HTTPException(status_code=400, detail=f"unknown columns: {sorted(unknown_columns)}")
+    indices = data_filter.indices(isin=selection)
+    return StreamingResponse(
+        iter_export(data_filter.df, indices, format, columns=columns),
+        media_type=EXPORT_FORMATS[format][0],
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(format)}"'}
+    )
+
 def streamlit_app():
     subprocess.Popen(['streamlit', 'run', 'dashboard.py', '--server.port', '8501'])
     return RedirectResponse(url='/index.html')
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8080)
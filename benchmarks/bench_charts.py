@@ -0,0 +1,150 @@
+"""Benchmark chart spec building and serialization with and without chart_cache.
+
+For a representative set of the dashboard's charts, times a rerun the way the
+dashboard used to do it (build the Altair chart / Plotly Express figure from
+scratch, then serialize it as Streamlit does) against the cached path (reuse
+the skeleton, inject the data, serialize). Each iteration uses a different
+random subset of the data so the cached path cannot reuse a previous result.
+
+    python benchmarks/bench_charts.py --iterations 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import altair as alt  # noqa: E402
+import plotly.express as px  # noqa: E402
+import plotly.io as pio  # noqa: E402
+import plotly.tools  # noqa: E402
+from streamlit import dataframe_util  # noqa: E402
+from streamlit.elements.vega_charts import _convert_altair_to_vega_lite_spec  # noqa: E402
+
+import chart_cache  # noqa: E402
+import data_layer  # noqa: E402
+
+THEME = 'viridis'
+HOVER_DATA = {'Inspection Year': True, 'Country': True, 'Audits Reviewed': True,
+              'Inspection Report Date': True, 'Global Network Company': True}
+
+
+# Chart definitions mirror dashboard.py
+
+def heatmap(data=None):
+    chart = alt.Chart() if data is None else alt.Chart(data)
+    return chart.mark_rect().encode(
+        y=alt.Y('Company:O', axis=alt.Axis(title="Company", titleFontSize=18, titlePadding=15, titleFontWeight=900, labelAngle=0)),
+        x=alt.X('Inspection Year:O', axis=alt.Axis(title="Year", titleFontSize=18, titlePadding=15, titleFontWeight=900, labelAngle=-45)),
+        color=alt.Color('max(document_sentiment_score):Q', legend=alt.Legend(title='document_sentiment_score', orient="right"),
+                        scale=alt.Scale(scheme=THEME)),
+        stroke=alt.value('black'),
+        strokeWidth=alt.value(0.25),
+    ).properties(width=1500, height=500)
+
+
+def word_count_plot(data=None):
+    chart = alt.Chart() if data is None else alt.Chart(data)
+    return chart.mark_bar().encode(
+        x=alt.X('mean_word_count:Q', title='Average Word Count', axis=alt.Axis(format=".2f")),
+        y=alt.Y('Company:N', sort='-x', title='Company'),
+        color='Country:N'
+    ).configure_axis(grid=False, titleFontSize=14, labelFontSize=12).configure_view(strokeWidth=0)
+
+
+def choropleth(data, theme):
+    figure = px.choropleth(data, locations='Country', color='Total Issuer Audit Clients', locationmode="country names",
+                           color_continuous_scale=theme,
+                           range_color=(data['Total Issuer Audit Clients'].min(), data['Total Issuer Audit Clients'].max()),
+                           scope="world")
+    figure.update_layout(template='plotly_dark', plot_bgcolor='rgba(0, 0, 0, 0)', paper_bgcolor='rgba(0, 0, 0, 0)',
+                         margin=dict(l=0, r=0, t=0, b=0), height=350)
+    return figure
+
+
+def sentiment_scatter(data, theme):
+    return px.scatter(data, x='document_sentiment_score', y='Part I.A Deficiency Rate', color='Firm Names',
+                      size='document_sentiment_score', hover_data=HOVER_DATA)
+
+
+def country_bar(data, theme):
+    return px.bar(data, x='Country', y='Total Issuer Audit Clients', color='Global Network Company',
+                  barmode='group').update_xaxes(tickangle=-45)
+
+
+def serialize_plotly(figure):
+    # What st.plotly_chart does with its argument
+    return pio.to_json(plotly.tools.return_figure_from_figure_or_data(figure, validate_figure=True), validate=False)
+
+
+def serialize_vega_lite(spec, data):
+    # What st.vega_lite_chart does with a spec and a separate dataframe
+    return json.dumps(spec), dataframe_util.convert_anything_to_arrow_bytes(data)
+
+
+def vega_lite_case(name, builder, columns):
+    def rebuild(df):
+        return _convert_altair_to_vega_lite_spec(builder(df[columns]))
+
+    def cached(df):
+        return serialize_vega_lite(chart_cache.vega_lite_spec(name, THEME, lambda theme: builder()), df[columns])
+    return rebuild, cached
+
+
+def plotly_case(name, builder, color_column=None, aggregate=None):
+    def prepare(df):
+        return aggregate(df) if aggregate else df
+
+    def rebuild(df):
+        return serialize_plotly(builder(prepare(df), THEME))
+
+    def cached(df):
+        data = prepare(df)
+        return serialize_plotly(chart_cache.plotly_figure(name, THEME, builder, data, color_column=color_column))
+    return rebuild, cached
+
+
+CASES = {
+    'heatmap (altair)': vega_lite_case('heatmap', heatmap, ['Company', 'Inspection Year', 'document_sentiment_score']),
+    'word count (altair)': vega_lite_case('word_count', word_count_plot, ['mean_word_count', 'Company', 'Country']),
+    'choropleth (plotly)': plotly_case('choropleth', choropleth, aggregate=data_layer.clients_by_country),
+    'sentiment scatter (plotly)': plotly_case('sentiment_scatter', sentiment_scatter, color_column='Firm Names'),
+    'country bar (plotly)': plotly_case('country_bar', country_bar, color_column='Global Network Company'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default=data_layer.DATA_PATH)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--fraction', type=float, default=0.8, help='share of rows in each random subset')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = data_layer.load_data(args.path).copy()
+    df['Total Issuer Audit Clients'] = df['Total Issuer Audit Clients'].fillna(0).astype(float)
+    df['Firm Names'] = df['Firm Name']
+    df['Global Network Company'] = df['Company']
+    df['mean_word_count'] = data_layer.mean_word_count_by_company(df)
+
+    rng = np.random.default_rng(args.seed)
+    subsets = [df.sample(frac=args.fraction, random_state=int(rng.integers(1 << 31))) for _ in range(args.iterations)]
+
+    print(f"{'chart':<28} {'rebuild':>12} {'cached':>12} {'speedup':>9}")
+    for name, (rebuild, cached) in CASES.items():
+        cached(subsets[0])  # build the skeleton once, as the first rerun in a process would
+        timings = []
+        for func in (rebuild, cached):
+            start = time.perf_counter()
+            for subset in subsets:
+                func(subset)
+            timings.append((time.perf_counter() - start) / len(subsets) * 1000)
+        print(f"{name:<28} {timings[0]:9.2f} ms {timings[1]:9.2f} ms {timings[0] / timings[1]:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
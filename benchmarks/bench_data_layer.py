@@ -0,0 +1,126 @@
+"""Benchmark the shared data layer hot path.
+
+Times loading, report date parsing, the compiled filter, the shared aggregates
+and the rolling deficiency trend against the chained ``df[...]`` filtering the
+dashboards used before ``data_layer`` existed, over randomized sidebar
+selections. The data can be replicated with ``--scale`` to see how the hot
+path grows with the dataset.
+
+    python benchmarks/bench_data_layer.py --scale 100 --iterations 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_layer  # noqa: E402
+
+
+def chained_filter(df, selection):
+    # The per-step copy-and-filter chain previously repeated in every entry point
+    df_filtered = df.copy()
+    for column, values in selection['isin'].items():
+        if values:
+            df_filtered = df_filtered[df_filtered[column].isin(values)]
+    ranges = dict(selection['ranges'])
+    dates = ranges.pop(data_layer.DATE_COLUMN, None)
+    for column, (low, high) in ranges.items():
+        df_filtered = df_filtered[(df_filtered[column] >= low) & (df_filtered[column] <= high)]
+    # A date range spanning every remaining dated row keeps the undated rows too
+    if dates is not None:
+        in_range = df_filtered[data_layer.DATE_COLUMN].between(*dates)
+        if (df_filtered[data_layer.DATE_COLUMN].notna() & ~in_range).any():
+            df_filtered = df_filtered[in_range]
+    return df_filtered
+
+
+def random_selection(df, rng):
+    def subset(column):
+        options = df[column].dropna().unique()
+        return list(rng.choice(options, size=rng.integers(1, len(options) + 1), replace=False))
+
+    def bounds(column):
+        low, high = np.sort(rng.uniform(df[column].min(), df[column].max(), size=2))
+        return (low, high)
+
+    def date_bounds():
+        low, high = np.sort(rng.choice(df[data_layer.DATE_COLUMN].dropna().to_numpy(), size=2))
+        return (pd.Timestamp(low), pd.Timestamp(high))
+
+    selection = data_layer.dashboard_selection(
+        inspection_types=subset('Inspection Type'), years=subset('Inspection Year'),
+        countries=subset('Country'), companies=subset('Company'),
+        total_issuer_audit_clients=bounds('Total Issuer Audit Clients'),
+        word_count=bounds('word_count'), sentiment_range=bounds('document_sentiment_score'),
+        report_dates=date_bounds())
+    return selection
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def report(name, samples):
+    samples = np.asarray(samples) * 1000
+    print(f"{name:<28} mean {samples.mean():8.3f} ms   p50 {np.percentile(samples, 50):8.3f} ms   "
+          f"p95 {np.percentile(samples, 95):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default=data_layer.DATA_PATH)
+    parser.add_argument('--scale', type=int, default=1, help='replicate the rows this many times')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    _, load_seconds = timed(data_layer.load_data, args.path)
+    _, cached_seconds = timed(data_layer.load_data, args.path)
+    df = data_layer.load_data(args.path)
+    if args.scale > 1:
+        df = pd.concat([df] * args.scale, ignore_index=True)
+    print(f"rows: {len(df)}   cold load: {load_seconds * 1000:.1f} ms   cached load: {cached_seconds * 1000:.3f} ms")
+
+    _, parse_seconds = timed(data_layer.parse_report_dates, df['Inspection Report Date'])
+    _, generic_seconds = timed(pd.to_datetime, df['Inspection Report Date'], format='mixed')
+    print(f"report date parse: {parse_seconds * 1000:.1f} ms   "
+          f"pd.to_datetime(format='mixed'): {generic_seconds * 1000:.1f} ms")
+
+    compiled, compile_seconds = timed(data_layer.CompiledFilter, df)
+    print(f"filter compile: {compile_seconds * 1000:.1f} ms (once per data file)")
+
+    rng = np.random.default_rng(args.seed)
+    chained, vectorized, aggregates, rolling = [], [], [], []
+    for _ in range(args.iterations):
+        selection = random_selection(df, rng)
+        expected, seconds = timed(chained_filter, df, selection)
+        chained.append(seconds)
+        result, seconds = timed(compiled.apply, **selection)
+        vectorized.append(seconds)
+        assert len(result) == len(expected)
+
+        start = time.perf_counter()
+        data_layer.key_metrics(result)
+        data_layer.clients_by_country(result)
+        data_layer.deficiency_by_year_company(result)
+        data_layer.mean_word_count_by_company(result)
+        aggregates.append(time.perf_counter() - start)
+
+        _, seconds = timed(data_layer.rolling_deficiency, compiled, compiled.indices(**selection))
+        rolling.append(seconds)
+
+    report('chained filter', chained)
+    report('compiled filter', vectorized)
+    report('shared aggregates', aggregates)
+    report('rolling deficiency', rolling)
+
+
+if __name__ == '__main__':
+    main()
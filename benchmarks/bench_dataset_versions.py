@@ -0,0 +1,89 @@
+"""Benchmark and check chunk sharing in ``dataset_versions``.
+
+Snapshots a data file into a temporary store, then snapshots two edited
+releases: one where a single missing value turns ``Inspection Year`` from
+int64 to float64, and one with an added column. Checks that every other
+column keeps exactly the same chunk hashes (so only the edited column is
+written and compared by the diff) and times the snapshots and diffs. The data
+can be replicated with ``--scale`` to see how they grow with the dataset.
+
+    python benchmarks/bench_dataset_versions.py --scale 40
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_versions  # noqa: E402
+
+EDITED_COLUMN = 'Inspection Year'
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def check_shared(old, new, edited):
+    # Every column other than the edited one keeps the chunks of the previous version
+    unshared = [name for name in old['columns']
+                if name != edited and old['columns'][name] != new['columns'].get(name)]
+    assert not unshared, f"editing {edited!r} rewrote the chunks of {unshared}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='data/PCAOB_inspection_reports.csv')
+    parser.add_argument('--scale', type=int, default=1, help='replicate the rows this many times')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path) if args.path.endswith('.csv') else pd.read_parquet(args.path, engine='pyarrow')
+    if args.scale > 1:
+        copies = []
+        for copy in range(args.scale):
+            # Distinct report links, so replicated rows are new reports rather than repeats
+            replica = df.copy()
+            link_column = next(column for column in dataset_versions.LINK_COLUMNS if column in df)
+            replica[link_column] = replica[link_column].astype(str) + f"-{copy}"
+            copies.append(replica)
+        df = pd.concat(copies, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = dataset_versions.DatasetStore(directory)
+        base, seconds = timed(store.snapshot, df, note='base')
+        print(f"rows: {len(df)}   chunks per column: {len(base['bounds']) - 1}   snapshot: {seconds * 1000:.1f} ms")
+
+        retyped = df.copy()
+        retyped[EDITED_COLUMN] = retyped[EDITED_COLUMN].astype('float64')
+        retyped.loc[retyped.index[len(df) // 2], EDITED_COLUMN] = np.nan
+        retyped_entry, seconds = timed(store.snapshot, retyped, note='retyped')
+        check_shared(base, retyped_entry, EDITED_COLUMN)
+        diff, diff_seconds = timed(dataset_versions.diff_versions, base['id'], retyped_entry['id'], store)
+        assert diff['unchanged_columns'] == [name for name in base['columns']
+                                             if name not in (dataset_versions.KEY_COLUMN, EDITED_COLUMN)]
+        assert len(diff['changed']) == 1
+        print(f"{EDITED_COLUMN} int64 -> float64: snapshot {seconds * 1000:.1f} ms, "
+              f"diff {diff_seconds * 1000:.1f} ms, {len(diff['unchanged_columns'])} columns skipped")
+
+        added = df.copy()
+        added['Added Column'] = 1
+        added_entry, seconds = timed(store.snapshot, added, note='added column')
+        check_shared(base, added_entry, 'Added Column')
+        diff, diff_seconds = timed(dataset_versions.diff_versions, base['id'], added_entry['id'], store)
+        assert diff['added_columns'] == ['Added Column'] and diff['changed'].empty
+        print(f"added column: snapshot {seconds * 1000:.1f} ms, "
+              f"diff {diff_seconds * 1000:.1f} ms, {len(diff['unchanged_columns'])} columns skipped")
+
+        restored = store.read(retyped_entry['id'])
+        assert restored[EDITED_COLUMN].dtype == 'float64' and store.read(base['id'])[EDITED_COLUMN].dtype == 'int64'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""Concurrent-session load test for the dashboard and the API.
+
+Runs N simulated sessions at each concurrency level and reports rerun (or
+request) latency percentiles, throughput and resident memory, so dynos can be
+sized and scaling regressions caught.
+
+``apptest`` mode drives ``dashboard.py`` with Streamlit AppTest sessions, one
+thread per session inside this process, the way a single Streamlit server
+serves its sessions. Each session replays randomized sidebar interactions
+(toggles, multiselect subsets, slider ranges, color theme) and every rerun is
+timed. RSS is that of this process. Before the timed runs, the dashboard is
+checked once with a selection that matches no rows (one global network and a
+firm from another), which must render without exceptions.
+
+``http`` mode sends randomized ``/statistics`` and ``/export`` requests to an
+``app.py`` instance. Without ``--url`` a local uvicorn server is started for
+the run; RSS is that of the server process. Failed requests are counted as
+errors and left out of the latency percentiles and throughput.
+
+    python benchmarks/load_test.py apptest --concurrency 1 2 4 8 --interactions 10
+    python benchmarks/load_test.py http --concurrency 1 4 16 --requests 50 --json load.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mib(pid=None):
+    """Current resident set size of a process in MiB (Linux), or peak RSS of this process elsewhere."""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/status") as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return float('nan')
+
+
+# Streamlit AppTest sessions
+
+def _random_interaction(at, rng):
+    sidebar = at.sidebar
+    widgets = ([('checkbox', w) for w in sidebar.checkbox] + [('multiselect', w) for w in sidebar.multiselect]
+               + [('slider', w) for w in sidebar.slider] + [('selectbox', w) for w in sidebar.selectbox])
+    kind, widget = rng.choice(widgets)
+    if kind == 'checkbox':
+        widget.check() if not widget.value else widget.uncheck()
+    elif kind == 'multiselect':
+        options = list(widget.options)
+        if options:
+            widget.set_value(rng.sample(options, rng.randint(1, len(options))))
+    elif kind == 'slider' and isinstance(widget.value[0], datetime.date):
+        # Date sliders (report date range) take dates; AppTest exposes their bounds in epoch microseconds
+        first, last = (datetime.datetime.fromtimestamp(bound / 1e6, datetime.timezone.utc).date()
+                       for bound in (widget.min, widget.max))
+        low, high = sorted(first + datetime.timedelta(days=rng.randint(0, (last - first).days)) for _ in range(2))
+        widget.set_range(low, high)
+    elif kind == 'slider':
+        low, high = sorted(rng.uniform(widget.min, widget.max) for _ in range(2))
+        if isinstance(widget.min, int):
+            low, high = int(low), int(high)
+        widget.set_range(low, high)
+    else:
+        widget.select(rng.choice(list(widget.options)))
+
+
+def _sidebar_multiselect(at, label):
+    return next((widget for widget in at.sidebar.multiselect if widget.label == label), None)
+
+
+def check_empty_selection(script, timeout):
+    """Run ``script`` with a selection that matches no rows and return the
+    exception messages it raised, or None if the script has no such filters."""
+    from streamlit.testing.v1 import AppTest
+
+    import data_layer
+
+    df = data_layer.load_data()
+    network = df['Company'].value_counts().index[0]
+    firms_in_network = set(df.loc[df['Company'] == network, 'Firm ID'])
+    other_firm = next(firm for firm in df['Firm ID'] if firm not in firms_in_network)
+
+    at = AppTest.from_file(script, default_timeout=timeout)
+    at.run()
+    if _sidebar_multiselect(at, 'Select Global Network') is None or _sidebar_multiselect(at, 'Select Firm Names') is None:
+        return None
+    _sidebar_multiselect(at, 'Select Global Network').set_value([network])
+    at.run()
+    _sidebar_multiselect(at, 'Select Firm Names').set_value([other_firm])
+    at.run()
+    return [exception.message for exception in at.exception]
+
+
+def run_apptest_session(script, interactions, seed, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(script, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    initial = time.perf_counter() - start
+    reruns, errors = [], len(at.exception)
+    for _ in range(interactions):
+        # A failing interaction or rerun counts as an error instead of aborting the whole run
+        try:
+            _random_interaction(at, rng)
+            start = time.perf_counter()
+            at.run()
+        except Exception:
+            errors += 1
+            continue
+        reruns.append(time.perf_counter() - start)
+        errors += len(at.exception)
+    return initial, reruns, errors
+
+
+def apptest_level(args, concurrency, level_seed):
+    script = os.path.join(ROOT, args.script)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(run_apptest_session, script, args.interactions, level_seed + i, args.timeout)
+                   for i in range(concurrency)]
+        results = [future.result() for future in futures]
+        wall = time.perf_counter() - start
+    return {
+        'initial': [initial for initial, _, _ in results],
+        'latencies': [latency for _, reruns, _ in results for latency in reruns],
+        'errors': sum(errors for _, _, errors in results),
+        'wall': wall,
+        'rss_mib': rss_mib(),
+    }
+
+
+# HTTP sessions against app.py
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server():
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port), '--log-level', 'warning'],
+                               cwd=ROOT)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/', timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("app.py did not start")
+
+
+def _http_options():
+    import data_layer
+
+    df = data_layer.load_data()
+    return {
+        'years': sorted(df['Inspection Year'].unique()),
+        'countries': sorted(df['Country'].unique()),
+        'companies': sorted(df['Company'].unique()),
+    }
+
+
+def run_http_session(url, options, requests, seed):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    for _ in range(requests):
+        params = [(name, value) for name, values in options.items() if rng.random() < 0.5
+                  for value in rng.sample(values, rng.randint(1, len(values)))]
+        if rng.random() < 0.5:
+            path = '/statistics'
+            params.append(('n_resamples', 500))
+        else:
+            path = '/export'
+            params.append(('format', rng.choice(['csv', 'parquet', 'arrow'])))
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f"{url}{path}?{urllib.parse.urlencode(params)}", timeout=120) as response:
+                while response.read(1 << 16):
+                    pass
+        except OSError:
+            # Timed-out and refused requests are counted, but kept out of the latency percentiles
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def http_level(args, concurrency, level_seed, url, server_pid, options):
+    peak_rss = [rss_mib(server_pid)]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(0.2):
+            peak_rss.append(rss_mib(server_pid))
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(run_http_session, url, options, args.requests, level_seed + i)
+                   for i in range(concurrency)]
+        results = [future.result() for future in futures]
+        wall = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    return {
+        'initial': [],
+        'latencies': [latency for latencies, _ in results for latency in latencies],
+        'errors': sum(errors for _, errors in results),
+        'wall': wall,
+        'rss_mib': max(peak_rss),
+    }
+
+
+def summarize(concurrency, result):
+    latencies = np.asarray(result['latencies']) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+    return {
+        'concurrency': concurrency,
+        'samples': int(len(latencies)),
+        'errors': result['errors'],
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'initial_p50_ms': float(np.median(result['initial']) * 1000) if result['initial'] else None,
+        'throughput_per_s': len(latencies) / result['wall'],
+        'rss_mib': result['rss_mib'],
+    }
+
+
+def print_row(row):
+    initial = f"{row['initial_p50_ms']:9.1f}" if row['initial_p50_ms'] is not None else f"{'-':>9}"
+    print(f"{row['concurrency']:>5} {row['samples']:>8} {row['errors']:>6} {row['p50_ms']:9.1f} {row['p95_ms']:9.1f} "
+          f"{row['p99_ms']:9.1f} {initial} {row['throughput_per_s']:10.2f} {row['rss_mib']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=['apptest', 'http'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--interactions', type=int, default=10, help='reruns per AppTest session')
+    parser.add_argument('--requests', type=int, default=50, help='requests per HTTP session')
+    parser.add_argument('--script', default='dashboard.py', help='Streamlit script for apptest mode')
+    parser.add_argument('--url', help='app.py base URL for http mode; a local server is started if omitted')
+    parser.add_argument('--timeout', type=float, default=300, help='AppTest rerun timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    server, url, server_pid, options = None, args.url, None, None
+    if args.mode == 'apptest':
+        failures = check_empty_selection(os.path.join(ROOT, args.script), args.timeout)
+        if failures:
+            parser.exit(1, "empty selection check failed:\n" + '\n'.join(failures) + '\n')
+        print(f"empty selection check: {'skipped' if failures is None else 'ok'}")
+    if args.mode == 'http':
+        options = _http_options()
+        if url is None:
+            server, url = start_server()
+            server_pid = server.pid
+
+    print(f"{'conc':>5} {'samples':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'init ms':>9} {'per sec':>10} {'RSS MiB':>9}")
+    rows = []
+    try:
+        for level, concurrency in enumerate(args.concurrency):
+            level_seed = args.seed + 1000 * level
+            if args.mode == 'apptest':
+                result = apptest_level(args, concurrency, level_seed)
+            else:
+                result = http_level(args, concurrency, level_seed, url, server_pid, options)
+            row = summarize(concurrency, result)
+            print_row(row)
+            rows.append(row)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'mode': args.mode, 'results': rows}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Chart skeleton cache for the dashboard.
+
+Building Altair charts and Plotly Express figures from scratch on every rerun
+repeats work that does not depend on the filtered data: encodings, axis and
+layout templates, the world geometry settings of the choropleth, and the
+per-series trace styling that Plotly Express derives from the color column.
+This module builds each chart's skeleton once per (chart, color theme) and on
+later reruns only injects the new data.
+
+* Altair charts are converted to a Vega-Lite spec without data; the dashboard
+  passes the spec and the data separately to ``st.vega_lite_chart``.
+* Plotly Express figures are built once from a one-row sentinel sample. Each
+  sentinel value tells us which column feeds which trace array, so a rerun
+  groups the data by the color column and fills in copies of the sample trace
+  instead of calling Plotly Express again.
+
+``benchmarks/bench_charts.py`` compares spec-build and serialization time with
+and without the cache.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from startup import lazy_import
+
+alt = lazy_import('altair')
+
+# Trace attributes Plotly Express fills from data columns
+ARRAY_PATHS = ['x', 'y', 'z', 'locations', 'labels', 'values', 'customdata', 'marker.size']
+# Plotly Express default for size_max, used to rescale marker.sizeref
+SIZE_MAX = 20
+
+_vega_lite_specs = {}
+_plotly_skeletons = {}
+
+
+def vega_lite_spec(name, theme, builder):
+    """Cached data-less Vega-Lite spec for ``builder(theme)``.
+
+    ``builder`` must return an Altair chart built without data and with
+    explicit field types. The spec is shared between reruns; callers must not
+    modify it.
+    """
+    key = (name, theme)
+    spec = _vega_lite_specs.get(key)
+    if spec is None:
+        # Streamlit renders Altair charts with the "none" theme; match it here
+        with alt.theme.enable('none'):
+            spec = builder(theme).to_dict()
+        spec.pop('data', None)
+        spec.pop('datasets', None)
+        _vega_lite_specs[key] = spec
+    return spec
+
+
+class _PlotlySkeleton:
+    """Layout and trace template captured from a Plotly Express sample figure."""
+
+    def __init__(self, layout, trace, columns, color_column, color_path, palette):
+        self.layout = layout
+        self.trace = trace
+        self.columns = columns
+        self.color_column = color_column
+        self.color_path = color_path
+        self.palette = palette
+
+
+def _sentinel_sample(df):
+    # One row in which every column holds a value that identifies the column
+    sample = df.head(1).copy()
+    for i, column in enumerate(sample.columns):
+        if pd.api.types.is_numeric_dtype(sample[column]) and not pd.api.types.is_bool_dtype(sample[column]):
+            sample[column] = np.array([987654321.0 + i])
+        else:
+            sample[column] = np.array([f'\x00sentinel{i}\x00'], dtype=object)
+    return sample
+
+
+def _get_path(d, path):
+    for part in path.split('.'):
+        if not isinstance(d, dict) or part not in d:
+            return None
+        d = d[part]
+    return d
+
+
+def _set_path(d, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        d = d.setdefault(part, {})
+    d[parts[-1]] = value
+
+
+def _pop_path(d, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        d = d.get(part, {})
+    d.pop(parts[-1], None)
+
+
+def _replace_strings(value, old, new):
+    if isinstance(value, str):
+        return value.replace(old, new)
+    if isinstance(value, dict):
+        return {k: _replace_strings(v, old, new) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_strings(v, old, new) for v in value]
+    return value
+
+
+def _build_plotly_skeleton(df, theme, builder, color_column):
+    sample = _sentinel_sample(df)
+    sentinels = {}
+    for column in sample.columns:
+        sentinels[sample[column].iloc[0]] = column
+
+    figure = builder(sample, theme)
+    if len(figure.data) != 1:
+        return None
+    trace = figure.data[0].to_plotly_json()
+
+    # Map each data-driven trace attribute back to its source column(s)
+    columns = {}
+    for path in ARRAY_PATHS:
+        values = _get_path(trace, path)
+        if values is None or np.ndim(values) == 0:
+            continue
+        values = np.asarray(values, dtype=object)
+        if path == 'customdata':
+            mapped = [sentinels.get(v) for v in values[0]]
+        else:
+            mapped = sentinels.get(values[0])
+        if mapped is None or (isinstance(mapped, list) and None in mapped):
+            # A column the sentinel sample could not identify; do not cache this chart
+            return None
+        columns[path] = mapped
+        _pop_path(trace, path)
+
+    layout = figure.to_dict()['layout']
+    palette = list(_get_path(layout, 'template.layout.colorway') or [])
+    color_path = None
+    if color_column is not None:
+        trace = _replace_strings(trace, sample[color_column].iloc[0], '\x00color\x00')
+        for path in ('marker.color', 'line.color'):
+            if palette and _get_path(trace, path) == palette[0]:
+                color_path = path
+    return _PlotlySkeleton(layout, trace, columns, color_column, color_path, palette)
+
+
+def _fill_trace(skeleton, data, name, index, sizeref):
+    trace = copy.deepcopy(skeleton.trace)
+    if skeleton.color_column is not None:
+        trace = _replace_strings(trace, '\x00color\x00', str(name))
+    if skeleton.color_path is not None:
+        _set_path(trace, skeleton.color_path, skeleton.palette[index % len(skeleton.palette)])
+    for path, column in skeleton.columns.items():
+        if path == 'customdata':
+            _set_path(trace, path, data[column].to_numpy(dtype=object))
+        else:
+            _set_path(trace, path, data[column].to_numpy())
+    if sizeref is not None:
+        _set_path(trace, 'marker.sizeref', sizeref)
+    return trace
+
+
+def _build_figure(builder, df, theme, layout_updates):
+    figure = builder(df, theme)
+    if layout_updates:
+        figure.update_layout(layout_updates)
+    return figure
+
+
+def plotly_figure(name, theme, builder, df, color_column=None, layout_updates=None):
+    """Figure dict for ``builder(df, theme)``, reusing a cached skeleton.
+
+    ``builder`` is a Plotly Express call whose traces are split only by
+    ``color_column`` (or not split at all). ``layout_updates`` are merged into
+    the cached layout for values derived from the data, such as color ranges.
+    Charts the skeleton cannot represent fall back to calling ``builder``.
+    """
+    key = (name, theme)
+    if key not in _plotly_skeletons and len(df):
+        _plotly_skeletons[key] = _build_plotly_skeleton(df, theme, builder, color_column)
+    skeleton = _plotly_skeletons.get(key)
+    if skeleton is None or not len(df):
+        return _build_figure(builder, df, theme, layout_updates)
+
+    sizeref = None
+    if 'marker.size' in skeleton.columns and _get_path(skeleton.trace, 'marker.sizeref') is not None:
+        sizeref = df[skeleton.columns['marker.size']].max() / (SIZE_MAX ** 2)
+
+    if color_column is None:
+        traces = [_fill_trace(skeleton, df, None, 0, sizeref)]
+    else:
+        traces = [_fill_trace(skeleton, group, category, i, sizeref)
+                  for i, (category, group) in enumerate(df.groupby(color_column, sort=False))]
+    if not traces:
+        # A figure dict without traces is rejected by st.plotly_chart; let Plotly Express build the empty figure
+        return _build_figure(builder, df, theme, layout_updates)
+
+    layout = dict(skeleton.layout)
+    for attr, value in (layout_updates or {}).items():
+        if isinstance(value, dict) and isinstance(layout.get(attr), dict):
+            layout[attr] = {**layout[attr], **value}
+        else:
+            layout[attr] = value
+    return {'data': traces, 'layout': layout}
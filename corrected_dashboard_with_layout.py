@@ -1,10 +1,10 @@
 
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import plotly.express as px
 #import seaborn as sns
 
+from data_layer import load_data, get_filter
+
 # Page configuration
 st.set_page_config(
     page_title="Enhanced PCAOB Inspection Dashboard",
@@ -13,16 +13,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load data
-df = pd.read_csv('final_transformed_data.csv')
-
-# Preprocess the data
-df['Inspection Year'] = df['Inspection Year'].astype(str)
-float_columns = df.select_dtypes(include=['float64']).columns
-df[float_columns] = df[float_columns].round(3)
-
-# Convert "Part I.A Deficiency Rate" to a numeric type after removing the "%" sign
-df['Part I.A Deficiency Rate'] = df['Part I.A Deficiency Rate'].str.replace('%', '').astype(float)
+# Load data (loading and preprocessing, including the "Part I.A Deficiency Rate" conversion,
+# are shared with the other dashboards through data_layer)
+DATA_PATH = 'final_transformed_data.csv'
+df = load_data(DATA_PATH)
+data_filter = get_filter(DATA_PATH)
 
 # Add a sidebar
 st.sidebar.title('📊 Enhanced PCAOB Inspection Dashboard')
@@ -54,25 +49,14 @@ sentiment_avg_values = sorted(df['sentiment_avg'].unique())
 selected_sentiments = st.sidebar.multiselect('Select sentiment scores', options=sentiment_avg_values, default=sentiment_avg_values)
 
 # Filter the dataframe based on sidebar selections
-df_filtered = df.copy()
-
-if selected_years:
-    df_filtered = df_filtered[df_filtered['Inspection Year'].isin(selected_years)]
-
-if selected_countries:
-    df_filtered = df_filtered[df_filtered['Country'].isin(selected_countries)]
-
-if selected_companies:
-    df_filtered = df_filtered[df_filtered['Company'].isin(selected_companies)]
-
-df_filtered = df_filtered[(df_filtered['word_count'] >= selected_word_count[0]) & (df_filtered['word_count'] <= selected_word_count[1])]
-
-if selected_sentiments:
-    df_filtered = df_filtered[df_filtered['sentiment_avg'].isin(selected_sentiments)]
+df_filtered = data_filter.apply(
+    isin={'Inspection Year': selected_years, 'Country': selected_countries,
+          'Company': selected_companies, 'sentiment_avg': selected_sentiments},
+    ranges={'word_count': selected_word_count}
+)
 
 #Filtered data
-df['Total Issuer Audit Clients'] = df['Total Issuer Audit Clients'].fillna(0)
-df_filtered = df[(df['Inspection Year'].isin(selected_years)) & (df['Company'].isin(selected_companies))]
+df_filtered['Total Issuer Audit Clients'] = df_filtered['Total Issuer Audit Clients'].fillna(0)
 
 # Main content layout
 
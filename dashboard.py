@@ -1,17 +1,36 @@
+import time
+run_start = time.perf_counter()
+
 import os
 #import redis
 #import pickle
 import streamlit as st
 import pandas as pd
-import altair as alt
-import plotly.express as px
 import re
+from urllib.parse import quote
 
 from dotenv import load_dotenv
 
+from data_layer import (DATA_PATH, load_data, get_filter, dashboard_selection, key_metrics,
+                        clients_by_country, deficiency_by_year_company, mean_word_count_by_company,
+                        firm_labels, firm_search_text, deficiency_by_year_firm, rolling_deficiency,
+                        report_lag_stats)
+from sentiment_stats import cached_statistics, make_filter_key
+from startup import lazy_import, log_first_render
+from chart_cache import vega_lite_spec, plotly_figure
+from export import EXPORT_FORMATS, ExportStream, export_filename, iter_export
+from dataset_versions import DatasetStore, KEY_COLUMN, diff_versions
+
+# Plotting libraries are imported by the first chart that needs them, after the scorecards have rendered
+alt = lazy_import('altair')
+px = lazy_import('plotly.express')
+
 # Get the port from the environment variable
 port = int(os.environ.get("PORT", 8501))
 
+# Base URL of an app.py instance serving the report PDF cache; links go straight to pcaobus.org when unset
+pdf_proxy_url = os.environ.get("PDF_PROXY_URL")
+
 # 3.2 Page configuration
 st.set_page_config(
     page_title="PCAOB Inspection Dashboard",
@@ -75,54 +94,9 @@ load_dotenv()  # Take environment variables from .env file
 #------------------------------------------------------------------------------------------------
 # 3.3 Load data
 # Reading the Parquet file in dashboard.py because csv file was too large for GitHub.
-df = pd.read_parquet('final_transformed_data_compressed.parquet', engine='pyarrow')
-
-# Preprocess the data
-df['Inspection Year'] = df['Inspection Year'].astype(str)
-df['Part I.A Deficiency Rate'] = df['Part I.A Deficiency Rate'].str.replace('%', '').astype(float)
-
-#Replace the certain values in the 'Company' column that are years to 'Non-Global Network Company' values
-# List of valid inspection years
-inspection_years = [str(year) for year in range(2000, 2035)]  # Adjust the range based on your data
-
-# Replace inspection years with 'Non-Global Network Company'
-df['Company'] = df['Company'].apply(
-    lambda x: 'Non-Global Network Company' if x in inspection_years else x
-)
-
-
-# Round float values to the nearest thousandths
-float_columns = df.select_dtypes(include=['float64']).columns
-df[float_columns] = df[float_columns].round(3)
-
-# Filter data and use Redis for caching
-#@redis_cache
-def filter_data(df, selected_inspection_type, selected_years, selected_countries, selected_companies, 
-                selected_total_issuer_audit_client_count, selected_total_audit_reviewed_count, 
-                selected_deficiency_rate_count, selected_word_count, selected_sentiment_range):
-    # Filter the dataframe based on selections
-    df_filtered = df.copy()
-    if selected_inspection_type:
-        df_filtered = df_filtered[df_filtered['Inspection Type'].isin(selected_inspection_type)]
-    if selected_years:
-        df_filtered = df_filtered[df_filtered['Inspection Year'].isin(selected_years)]
-    if selected_countries:
-        df_filtered = df_filtered[df_filtered['Country'].isin(selected_countries)]
-    if selected_companies:
-        df_filtered = df_filtered[df_filtered['Company'].isin(selected_companies)]
-    
-    df_filtered = df_filtered[(df_filtered['Total Issuer Audit Clients'] >= selected_total_issuer_audit_client_count[0]) & 
-                              (df_filtered['Total Issuer Audit Clients'] <= selected_total_issuer_audit_client_count[1])]
-    df_filtered = df_filtered[(df_filtered['Audits Reviewed'] >= selected_total_audit_reviewed_count[0]) & 
-                              (df_filtered['Audits Reviewed'] <= selected_total_audit_reviewed_count[1])]
-    df_filtered = df_filtered[(df_filtered['Part I.A Deficiency Rate'] >= selected_deficiency_rate_count[0]) & 
-                              (df_filtered['Part I.A Deficiency Rate'] <= selected_deficiency_rate_count[1])]
-    df_filtered = df_filtered[(df_filtered['word_count'] >= selected_word_count[0]) & 
-                              (df_filtered['word_count'] <= selected_word_count[1])]
-    df_filtered = df_filtered[(df_filtered['document_sentiment_score'] >= selected_sentiment_range[0]) & 
-                              (df_filtered['document_sentiment_score'] <= selected_sentiment_range[1])]
-    
-    return df_filtered
+# Loading, preprocessing and filtering are shared with the other entry points through data_layer.
+df = load_data(DATA_PATH)
+data_filter = get_filter(DATA_PATH)
 
 # 3.4 Add a sidebar
 with st.sidebar:
@@ -181,7 +155,7 @@ with st.sidebar:
     # Years Filter
     with st.expander("Select Years"):
         if not reintroduce_pre_2015:
-            df = df[df['Inspection Year'].astype(int) >= 2015]
+            df = data_filter.apply(ranges={'Inspection Year': (2015, float('inf'))})
 
         years_input = st.text_input("Type to search Years (you can separate search terms with a comma)", value="")
         search_terms = [term.strip().lower() for term in re.split(r'[,\s;]+', years_input) if term]
@@ -243,16 +217,19 @@ with st.sidebar:
         firm_names_input = st.text_input("Type to search Firm Names (you can separate search terms with a comma)", value="")
         search_terms = [term.strip().lower() for term in re.split(r'[,\s;]+', firm_names_input) if term]
         
-        # Filter firm names
+        # Filter firm names; firms are selected by resolved firm id and the search matches every scraped spelling
+        firm_label = firm_labels(df)
         if search_terms:
-            filtered_firms = sorted([x for x in df['Inspection Report Company'].unique() if any(term in x.lower() for term in search_terms)])
+            firm_text = firm_search_text(df)
+            filtered_firms = [x for x in firm_label.index if any(term in firm_text[x] for term in search_terms)]
         else:
-            filtered_firms = sorted(df['Inspection Report Company'].unique())
+            filtered_firms = list(firm_label.index)
         
         selected_firms = st.multiselect(
             'Select Firm Names',
             options=filtered_firms,
             default=filtered_firms,
+            format_func=lambda firm_id: firm_label[firm_id],
             help="Type in the firm name to search and filter.\n Enter multiple values typing space, comma, or semi-colon."
         )
 
@@ -286,6 +263,12 @@ with st.sidebar:
         sentiment_max = round(df['document_sentiment_score'].max(), 2)
         selected_sentiment_range = st.slider('Select sentiment score range', min_value=sentiment_min, max_value=sentiment_max, value=(sentiment_min, sentiment_max))
 
+    # Add a slider filter for the report date, parsed from Inspection Report Date at load time
+    with st.expander("Inspection Report Date Range"):
+        report_date_min = df['Report Date'].min().date()
+        report_date_max = df['Report Date'].max().date()
+        selected_report_dates = st.slider('Select report date range', min_value=report_date_min, max_value=report_date_max, value=(report_date_min, report_date_max), format="MMM YYYY")
+
     color_theme_list = ['viridis', 'cividis', 'blues', 'reds', 'plasma', 'inferno']
     selected_color_theme = st.selectbox('Select a color theme', color_theme_list)
 
@@ -320,24 +303,29 @@ with st.sidebar:
 #df_filtered['Part I.A Deficiency Rate'] = df_filtered['Part I.A Deficiency Rate'].str.replace('%', '').astype(float)
 
 # Apply the filters and cache the result
-df_filtered = filter_data(df, selected_inspection_type, selected_years, selected_countries, selected_companies,
-                          selected_total_issuer_audit_client_count, selected_total_audit_reviewed_count,
-                          selected_deficiency_rate_count, selected_word_count, selected_sentiment_range)
+selected_rows = data_filter.indices(**dashboard_selection(
+    inspection_types=selected_inspection_type, years=selected_years, countries=selected_countries,
+    companies=selected_companies, firms=selected_firms,
+    total_issuer_audit_clients=selected_total_issuer_audit_client_count,
+    audits_reviewed=selected_total_audit_reviewed_count, deficiency_rate=selected_deficiency_rate_count,
+    word_count=selected_word_count, sentiment_range=selected_sentiment_range, report_dates=selected_report_dates,
+    include_non_global=reintroduce_non_global, include_pre_2015=reintroduce_pre_2015))
+df_filtered = data_filter.df.iloc[selected_rows]
 
 
 # Replace NaN values in the 'Total Issuer Audit Clients' column with 0 and convert to float
 df_filtered['Total Issuer Audit Clients'] = df_filtered['Total Issuer Audit Clients'].fillna(0).astype(float)
 #df['Total Issuer Audit Clients'] = df['Total Issuer Audit Clients'].fillna(0)
 #df_filtered = df[(df['Inspection Year'].isin(selected_years)) & (df['Company'].isin(selected_companies))]
-df_filtered['Total Issuer Audit Clients'].fillna(0, inplace=True)
 
 # Apply document_sentiment_score filter
 #df_filtered = df_filtered[(df_filtered['document_sentiment_score'] >= selected_sentiment_range[0]) & (df_filtered['document_sentiment_score'] <= selected_sentiment_range[1])]
 
 # 3.4b Calculate key metrics
-total_clients = df_filtered['Total Issuer Audit Clients'].sum()
-avg_sentiment = df_filtered['document_sentiment_score'].mean()
-avg_word_count = df_filtered['word_count'].mean()
+metrics = key_metrics(df_filtered)
+total_clients = metrics['total_clients']
+avg_sentiment = metrics['avg_sentiment']
+avg_word_count = metrics['avg_word_count']
 
 # Check if total_clients is NaN or None, and handle accordingly
 if pd.isna(total_clients):
@@ -370,11 +358,16 @@ col1.metric("Total Issuer Audit Clients", f"{total_clients_display}")
 col2.metric("Average Sentiment", f"{avg_sentiment_display}")
 col3.metric("Average Word Count", f"{avg_word_count_display}")
 
+# Scorecards are the first data-backed output; log how long it took to get here
+log_first_render(run_start)
+
 # 3.5 Plot and chart types
+# Altair charts are built without data; chart_cache turns them into a Vega-Lite spec once per color theme
+# and the filtered data is passed separately to st.vega_lite_chart on every rerun.
 
 # Heatmap
-def make_heatmap(input_df, input_y, input_x, input_color, input_color_theme):
-    heatmap = alt.Chart(input_df).mark_rect().encode(
+def make_heatmap(input_y, input_x, input_color, input_color_theme):
+    heatmap = alt.Chart().mark_rect().encode(
     y=alt.Y(f'{input_y}:O', axis=alt.Axis(title="Company", titleFontSize=18, titlePadding=15, titleFontWeight=900, labelAngle=0)),
     x=alt.X(f'{input_x}:O', axis=alt.Axis(title="Year", titleFontSize=18, titlePadding=15, titleFontWeight=900, labelAngle=-45)),  # Tilted labels
     color=alt.Color(f'max({input_color}):Q',
@@ -405,17 +398,17 @@ def make_choropleth(input_df, input_id, input_column, input_color_theme):
     return choropleth
 
 # Line chart for sentiment analysis
-def make_line_chart(input_df):
-    line_chart = alt.Chart(input_df).mark_line(point=True).encode(
-        x=alt.X('Inspection Year', axis=alt.Axis(labelAngle=-45)),  # Tilt x-axis labels by 45 degrees
-        y=alt.Y('mean(document_sentiment_score)', scale=alt.Scale(domain=[0.85, 1.0])),
-        color='Company'
+def make_line_chart():
+    line_chart = alt.Chart().mark_line(point=True).encode(
+        x=alt.X('Inspection Year:N', axis=alt.Axis(labelAngle=-45)),  # Tilt x-axis labels by 45 degrees
+        y=alt.Y('mean(document_sentiment_score):Q', scale=alt.Scale(domain=[0.85, 1.0])),
+        color='Company:N'
     )
     return line_chart
 
 # Line chart for deficiency rate
-def make_line_chart2(input_df):
-    line_chart2 = alt.Chart(input_df).mark_line(point=True).encode(
+def make_line_chart2():
+    line_chart2 = alt.Chart().mark_line(point=True).encode(
         x=alt.X('Inspection Year:O', axis=alt.Axis(labelAngle=-45)),  # Tilt x-axis labels by 45 degrees
         y=alt.Y('Part I.A Deficiency Rate:Q', axis=alt.Axis(title="Part I.A Deficiency Rate (%)")),
         color='Company:N'
@@ -423,11 +416,8 @@ def make_line_chart2(input_df):
     return line_chart2
 
 # Word count plot
-def make_word_count_plot(input_df):
-    # Calculate the average word count rounded to three decimal places
-    input_df['mean_word_count'] = input_df.groupby('Company')['word_count'].transform('mean').round(2)
-    
-    word_count_plot = alt.Chart(input_df).mark_bar().encode(
+def make_word_count_plot():
+    word_count_plot = alt.Chart().mark_bar().encode(
         x=alt.X('mean_word_count:Q', title='Average Word Count', axis=alt.Axis(format=".2f")),  # Ensure x-axis values are rounded to three decimal places
         y=alt.Y('Company:N', sort='-x', title='Company'),
         color='Country:N'
@@ -465,23 +455,24 @@ def make_word_count_plot(input_df):
 
 #-------------------------------------------------------------------------------------
 #Renaming legend names/columns Company to Global Network and Inspection Report Company to Firm Names
-df_filtered['Firm Names'] = df_filtered['Inspection Report Company']
+df_filtered['Firm Names'] = df_filtered['Firm Name']
 df_filtered['Global Network Company'] = df_filtered['Company']
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
 
 #Aggregated Metrics for Choropleth Map
-df_aggregated = df_filtered.groupby('Country')['Total Issuer Audit Clients'].sum().reset_index()
-df_aggregated1 = df_filtered.groupby(['Inspection Year', 'Company'], as_index=False)['Part I.A Deficiency Rate'].mean()
+df_aggregated = clients_by_country(df_filtered)
+df_aggregated1 = deficiency_by_year_company(df_filtered)
 
 # First Row: Heatmap
 st.markdown('#### Heatmap of Sentiment Scores by Year and Global Network Company')
 st.markdown("This heatmap shows the average sentiment scores over the years for each Global Network Company. "
             "Darker colors represent more negative sentiments, while lighter colors represent more positive sentiments. The color scale on the right side of the plot "
     "indicates the exact sentiment score range.")
-heatmap = make_heatmap(df_filtered, 'Company', 'Inspection Year', 'document_sentiment_score', selected_color_theme)
-st.altair_chart(heatmap, use_container_width=True)
+heatmap = vega_lite_spec('heatmap', selected_color_theme,
+                         lambda theme: make_heatmap('Company', 'Inspection Year', 'document_sentiment_score', theme))
+st.vega_lite_chart(df_filtered[['Company', 'Inspection Year', 'document_sentiment_score']], heatmap, use_container_width=True, key='heatmap')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -492,8 +483,12 @@ st.markdown("This choropleth map displays the distribution of total issuer audit
             "The color intensity on the map indicates the number of audit clients in each country, "
     "with a darker color representing a higher number of clients. The color scale on the right side of the plot "
     "provides the exact range of audit clients.")
-choropleth = make_choropleth(df_aggregated, 'Country', 'Total Issuer Audit Clients', selected_color_theme)
-st.plotly_chart(choropleth, use_container_width=True)
+choropleth = plotly_figure('choropleth', selected_color_theme,
+                           lambda data, theme: make_choropleth(data, 'Country', 'Total Issuer Audit Clients', theme),
+                           df_aggregated,
+                           layout_updates={'coloraxis': {'cmin': df_aggregated['Total Issuer Audit Clients'].min(),
+                                                         'cmax': df_aggregated['Total Issuer Audit Clients'].max()}})
+st.plotly_chart(choropleth, use_container_width=True, key='choropleth')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -503,8 +498,8 @@ st.markdown(
     "This line chart visualizes the average sentiment score over the years across different companies. "
     "Each line represents a global network company, and the chart helps identify trends in sentiment over time."
 )
-line_chart = make_line_chart(df_filtered)
-st.altair_chart(line_chart, use_container_width=True)
+line_chart = vega_lite_spec('sentiment_line', None, lambda theme: make_line_chart())
+st.vega_lite_chart(df_filtered[['Inspection Year', 'document_sentiment_score', 'Company']], line_chart, use_container_width=True, key='line_chart')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -514,15 +509,56 @@ st.markdown(
     "This line chart visualizes the average Part I.A Deficiency Rate over the years across different companies. "
     "Each line represents a global network company, and the chart helps identify trends in deficiency rate over time."
 )
-line_fig = px.line(
-    df_aggregated1,
+line_fig = plotly_figure('deficiency_line', None, lambda data, theme: px.line(
+    data,
     x='Inspection Year',
     y='Part I.A Deficiency Rate',
     color='Company',
     markers=True
+), df_aggregated1, color_column='Company')
+
+st.plotly_chart(line_fig, use_container_width=True, key='line_fig')
+
+st.markdown(
+    "#### Average Part I.A Deficiency Rate by Year and Firm\n"
+    "Each line represents one firm, with its reports combined across the different spellings of its name. "
+    "Click a firm in the legend to hide it, or double-click to show only that firm."
 )
+line_fig_firm = plotly_figure('deficiency_line_firm', None, lambda data, theme: px.line(
+    data,
+    x='Inspection Year',
+    y='Part I.A Deficiency Rate',
+    color='Firm',
+    markers=True
+), deficiency_by_year_firm(df_filtered), color_column='Firm')
 
-st.plotly_chart(line_fig, use_container_width=True)
+st.plotly_chart(line_fig_firm, use_container_width=True, key='line_fig_firm')
+
+# Add a separator line or space
+st.markdown("---")  # This adds a horizontal line for separation.
+
+st.markdown(
+    "#### Rolling 12-Month Part I.A Deficiency Rate by Global Network Company\n"
+    "At the start of each quarter, this line chart shows the average Part I.A Deficiency Rate of the reports issued in the preceding 12 months, "
+    "based on the inspection report dates rather than inspection years."
+)
+rolling_fig = plotly_figure('rolling_deficiency_line', None, lambda data, theme: px.line(
+    data,
+    x='Report Date',
+    y='Part I.A Deficiency Rate',
+    color='Company',
+    hover_data={'Reports': True}
+), rolling_deficiency(data_filter, selected_rows), color_column='Company')
+st.plotly_chart(rolling_fig, use_container_width=True, key='rolling_fig')
+
+st.markdown("Days from the end of the inspection year to the report date, by Global Network Company:")
+st.dataframe(report_lag_stats(df_filtered).rename(columns={
+    'Company': 'Global Network Company',
+    'reports': 'Reports',
+    'median_days': 'Median lag (days)',
+    'p90_days': '90th percentile lag (days)',
+    'max_days': 'Max lag (days)'
+}), hide_index=True, use_container_width=True)
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -533,8 +569,10 @@ st.markdown(
     "It provides insight into the typical length of reports produced by different companies, "
     "which could reflect the complexity or thoroughness of the audits. Higher word counts might indicate more detailed reports."
 )
-word_count_plot = make_word_count_plot(df_filtered)
-st.altair_chart(word_count_plot, use_container_width=True)
+# Calculate the average word count rounded to two decimal places
+df_filtered['mean_word_count'] = mean_word_count_by_company(df_filtered)
+word_count_plot = vega_lite_spec('word_count', None, lambda theme: make_word_count_plot())
+st.vega_lite_chart(df_filtered[['mean_word_count', 'Company', 'Country']], word_count_plot, use_container_width=True, key='word_count_plot')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -547,8 +585,10 @@ st.markdown(
     "This pie chart shows the distribution of total issuer audit clients among different companies. "
     "It provides a visual breakdown of how audit clients are distributed across companies."
 )
-fig_pie = px.pie(df_filtered, names='Company', values='Total Issuer Audit Clients')
-st.plotly_chart(fig_pie, use_container_width=True)
+fig_pie = plotly_figure('clients_pie', None,
+                        lambda data, theme: px.pie(data, names='Company', values='Total Issuer Audit Clients'),
+                        df_filtered)
+st.plotly_chart(fig_pie, use_container_width=True, key='fig_pie')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -560,10 +600,12 @@ st.markdown(
     "This bar chart presents the total number of issuer audit clients for each company, categorized by country. "
     "The chart provides insight into the geographic distribution of audit clients among different companies."
 )
-fig_bar = px.bar(df_filtered, x='Country', y='Total Issuer Audit Clients', color='Global Network Company', barmode='group')
-# Update the layout to tilt the x-axis labels
-fig_bar.update_xaxes(tickangle=-45)
-st.plotly_chart(fig_bar, use_container_width=True)
+# Tilt the x-axis labels
+fig_bar = plotly_figure('clients_by_country_bar', None,
+                        lambda data, theme: px.bar(data, x='Country', y='Total Issuer Audit Clients',
+                                                   color='Global Network Company', barmode='group').update_xaxes(tickangle=-45),
+                        df_filtered, color_column='Global Network Company')
+st.plotly_chart(fig_bar, use_container_width=True, key='fig_bar')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -576,7 +618,8 @@ st.markdown(
     "This scatter plot compares the total number of issuer audit clients with the Part I.A Deficiency Rate for each Global Network Company. "
     "The plot helps identify any correlation between the number of clients and the deficiency rates."
 )
-fig_scatter = px.scatter(df_filtered, x='Total Issuer Audit Clients',
+fig_scatter = plotly_figure('clients_vs_deficiency_scatter', None, lambda data, theme: px.scatter(
+                         data, x='Total Issuer Audit Clients',
                          y='Part I.A Deficiency Rate', color='Global Network Company',
                          size='Total Issuer Audit Clients',
                          hover_data={
@@ -586,8 +629,8 @@ fig_scatter = px.scatter(df_filtered, x='Total Issuer Audit Clients',
                             'Inspection Report Date': True,
                             'Global Network Company': True
                         }
-)
-st.plotly_chart(fig_scatter, use_container_width=True)
+), df_filtered, color_column='Global Network Company')
+st.plotly_chart(fig_scatter, use_container_width=True, key='fig_scatter')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -599,7 +642,8 @@ st.markdown(
     "This scatter plot compares the sentiment score for each document with the Part I.A Deficiency Rate for each Global Network Company or Country. "
     "The size of each point indicates the magnitude of sentiment scores, while the position shows the relationship between sentiment and deficiency rates."
 )
-fig_scatter_1 = px.scatter(df_filtered, x='document_sentiment_score', 
+fig_scatter_1 = plotly_figure('sentiment_vs_deficiency_scatter', None, lambda data, theme: px.scatter(
+                           data, x='document_sentiment_score',
                            y='Part I.A Deficiency Rate', color='Firm Names', 
                            size='document_sentiment_score',
                            hover_data={
@@ -609,8 +653,44 @@ fig_scatter_1 = px.scatter(df_filtered, x='document_sentiment_score',
                             'Inspection Report Date': True,
                             'Global Network Company': True
                         }
+), df_filtered, color_column='Firm Names')
+st.plotly_chart(fig_scatter_1, use_container_width=True, key='fig_scatter_1')
+
+# Correlation and trend statistics for the current filter selection
+filter_key = make_filter_key(reintroduce_non_global, reintroduce_pre_2015, selected_inspection_type,
+                             selected_years, selected_countries, selected_companies, selected_firms,
+                             selected_total_issuer_audit_client_count, selected_total_audit_reviewed_count,
+                             selected_deficiency_rate_count, selected_word_count, selected_sentiment_range,
+                             selected_report_dates)
+sentiment_stats = cached_statistics(filter_key, df_filtered, data_filter.data_token)
+
+def format_stat(value):
+    return "n/a" if value is None else f"{value:.3f}"
+
+st.markdown(
+    "##### Sentiment vs. Deficiency Rate Statistics\n"
+    f"Computed over {sentiment_stats['n']} reports in the current selection, "
+    f"with {int(sentiment_stats['confidence'] * 100)}% bootstrap confidence intervals."
 )
-st.plotly_chart(fig_scatter_1, use_container_width=True)
+stat_col1, stat_col2 = st.columns(2)
+stat_col1.metric("Pearson correlation", format_stat(sentiment_stats['pearson']))
+stat_col1.caption(f"CI: [{format_stat(sentiment_stats['pearson_ci'][0])}, {format_stat(sentiment_stats['pearson_ci'][1])}]")
+stat_col2.metric("Spearman correlation", format_stat(sentiment_stats['spearman']))
+stat_col2.caption(f"CI: [{format_stat(sentiment_stats['spearman_ci'][0])}, {format_stat(sentiment_stats['spearman_ci'][1])}]")
+
+st.markdown("Year-over-year trend in Part I.A Deficiency Rate (percentage points per year) by Global Network Company:")
+st.dataframe(pd.DataFrame(sentiment_stats['trends']).rename(columns={
+    'company': 'Global Network Company',
+    'slope_per_year': 'Trend (pp / year)',
+    'reports': 'Reports'
+}), hide_index=True, use_container_width=True)
+
+st.markdown("Year-over-year trend in Part I.A Deficiency Rate (percentage points per year) by firm:")
+st.dataframe(pd.DataFrame(sentiment_stats['firm_trends'], columns=['firm', 'slope_per_year', 'reports']).rename(columns={
+    'firm': 'Firm Names',
+    'slope_per_year': 'Trend (pp / year)',
+    'reports': 'Reports'
+}), hide_index=True, use_container_width=True)
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -622,8 +702,11 @@ st.markdown(
     "This bar chart displays the total number of issuer audit clients for each Global Network Company, broken down by inspection year. "
     "It highlights trends over time and allows for comparison between companies."
 )
-fig_bar_year = px.bar(df_filtered, x='Inspection Year', y='Total Issuer Audit Clients', color='Global Network Company')
-st.plotly_chart(fig_bar_year, use_container_width=True)
+fig_bar_year = plotly_figure('clients_by_year_bar', None,
+                             lambda data, theme: px.bar(data, x='Inspection Year', y='Total Issuer Audit Clients',
+                                                        color='Global Network Company'),
+                             df_filtered, color_column='Global Network Company')
+st.plotly_chart(fig_bar_year, use_container_width=True, key='fig_bar_year')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -636,8 +719,11 @@ st.markdown(
     "The box represents the interquartile range (IQR), the line inside the box represents the median, "
     "and the whiskers show the range of the data."
 )
-fig_box_sentiment = px.box(df_filtered, x='Company', y='document_sentiment_score', color='Global Network Company')
-st.plotly_chart(fig_box_sentiment, use_container_width=True)
+fig_box_sentiment = plotly_figure('sentiment_box', None,
+                                  lambda data, theme: px.box(data, x='Company', y='document_sentiment_score',
+                                                             color='Global Network Company'),
+                                  df_filtered, color_column='Global Network Company')
+st.plotly_chart(fig_box_sentiment, use_container_width=True, key='fig_box_sentiment')
 
 # Add a separator line or space
 st.markdown("---")  # This adds a horizontal line for separation.
@@ -649,15 +735,66 @@ st.markdown(
     "This histogram illustrates the distribution of word counts in audit reports across different companies. "
     "It helps identify how word counts vary among companies, indicating differences in report length."
 )
-fig_hist_word_count = px.histogram(df_filtered, x='word_count', color='Global Network Company')
-st.plotly_chart(fig_hist_word_count, use_container_width=True)
+fig_hist_word_count = plotly_figure('word_count_histogram', None,
+                                    lambda data, theme: px.histogram(data, x='word_count', color='Global Network Company'),
+                                    df_filtered, color_column='Global Network Company')
+st.plotly_chart(fig_hist_word_count, use_container_width=True, key='fig_hist_word_count')
 
 # Create a new column with hyperlinks
-df_filtered['pdf_link_hyperlink'] = df_filtered['pdf_link'].apply(lambda x: f'<a href="{x}" target="_blank">data source - pdf</a>')
+def pdf_href(link):
+    if pdf_proxy_url:
+        return f"{pdf_proxy_url.rstrip('/')}/pdfs/report?url={quote(link, safe='')}"
+    return link
+
+df_filtered['pdf_link_hyperlink'] = df_filtered['pdf_link'].apply(lambda x: f'<a href="{pdf_href(x)}" target="_blank">data source - pdf</a>')
 
 
 # Add an additional table below to manually allow users to click on the PDF link
 st.write("You can click on the PDF links below for more details:")
 
 # Display a clickable table with Inspection Year, Company, and PDF links
-st.write(df_filtered[['pdf_link_hyperlink', 'Inspection Report Date', 'Inspection Year', 'Inspection Type', 'Part I.A Deficiency Rate', 'Country', 'Global Network Company', 'Firm Names', 'document_sentiment_score']].head(10).to_html(escape=False, index=False), unsafe_allow_html=True)
\ No newline at end of file
+st.write(df_filtered[['pdf_link_hyperlink', 'Inspection Report Date', 'Inspection Year', 'Inspection Type', 'Part I.A Deficiency Rate', 'Country', 'Global Network Company', 'Firm Names', 'document_sentiment_score']].head(10).to_html(escape=False, index=False), unsafe_allow_html=True)
+
+# What changed between dataset versions recorded at ingest; shown once there are at least two
+dataset_store = DatasetStore()
+dataset_versions = dataset_store.versions()
+if len(dataset_versions) >= 2:
+    st.markdown("---")  # This adds a horizontal line for separation.
+    latest_version = dataset_versions[-1]
+    st.markdown(
+        "#### What Changed Since a Previous Dataset Version\n"
+        f"Reports added, removed or restated between the selected version and the latest one ({latest_version['id']}, "
+        f"{latest_version['created']}). Reports are matched by their PDF link."
+    )
+    versions_by_id = {entry['id']: entry for entry in dataset_versions}
+    base_version = st.selectbox(
+        'Compare with version', [entry['id'] for entry in dataset_versions[:-1]][::-1],
+        format_func=lambda version_id: ' - '.join(
+            part for part in (version_id, versions_by_id[version_id]['created'],
+                              versions_by_id[version_id]['note']) if part))
+    diff = diff_versions(base_version, latest_version['id'], dataset_store, versions=dataset_versions)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Reports Added", len(diff['added']))
+    col2.metric("Reports Removed", len(diff['removed']))
+    col3.metric("Reports Changed", diff['changed'][KEY_COLUMN].nunique())
+    if len(diff['changed']):
+        st.dataframe(diff['changed'].astype(str).rename(columns={
+            KEY_COLUMN: 'Report', 'column': 'Column', 'old': base_version, 'new': latest_version['id']
+        }), hide_index=True, use_container_width=True)
+    if diff['added']:
+        with st.expander(f"Added reports ({len(diff['added'])})"):
+            st.dataframe(pd.DataFrame({'Report': diff['added']}), hide_index=True, use_container_width=True)
+    if diff['removed']:
+        with st.expander(f"Removed reports ({len(diff['removed'])})"):
+            st.dataframe(pd.DataFrame({'Report': diff['removed']}), hide_index=True, use_container_width=True)
+
+# Export the full filtered selection; the file is encoded in chunks from the selected row indices when the button is clicked
+st.markdown("---")  # This adds a horizontal line for separation.
+st.markdown("#### Export Filtered Data")
+export_format = st.selectbox('Export format', list(EXPORT_FORMATS), format_func=str.upper)
+st.download_button(
+    f"Download {len(selected_rows)} rows as {export_format.upper()}",
+    data=lambda: ExportStream(iter_export(data_filter.df, selected_rows, export_format)),
+    file_name=export_filename(export_format),
+    mime=EXPORT_FORMATS[export_format][0]
+)
@@ -0,0 +1,435 @@
+"""Shared data access for the PCAOB dashboards and API.
+
+``dashboard.py``, ``streamlit_app.py``, ``corrected_dashboard_with_layout.py``
+and ``app.py`` all load, preprocess, filter and aggregate the inspection data
+through this module, so an improvement to the hot path applies to every entry
+point and ``benchmarks/bench_data_layer.py`` measures all of them at once.
+
+The loaded frame is cached per file path and modification time. When a
+preprocessed Arrow IPC snapshot of the source file exists (built at deploy time
+with ``python data_layer.py build-snapshot``), it is memory-mapped instead of
+re-reading and re-preprocessing the source. Preprocessing also resolves the
+scraped firm name variants to a stable ``Firm ID`` (see ``firm_resolution``),
+which the firm filter and the per-firm aggregates use, and parses
+``Inspection Report Date`` once into the datetime64 ``Report Date`` column.
+Filtering goes through a ``CompiledFilter``, which factorizes the categorical
+columns and extracts the numeric columns to NumPy once, so each rerun only
+builds a single boolean mask instead of copying the frame for every filter
+step. Report date ranges, rolling-window trends and report-lag statistics go
+through its ``TimeIndex``, which keeps the rows sorted by report date so a
+date range is two ``searchsorted`` calls.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from firm_resolution import resolve_firms
+
+DATA_PATH = 'final_transformed_data_compressed.parquet'
+
+# Bump when preprocess() changes so stale snapshots are rebuilt rather than loaded
+SNAPSHOT_VERSION = '3'
+
+# Columns filtered by membership (multiselects) and by range (sliders)
+CATEGORICAL_COLUMNS = ['Inspection Type', 'Inspection Year', 'Country', 'Company', 'Firm ID']
+RANGE_COLUMNS = ['Inspection Year', 'Total Issuer Audit Clients', 'Audits Reviewed',
+                 'Part I.A Deficiency Rate', 'word_count', 'document_sentiment_score', 'sentiment_avg']
+
+NON_GLOBAL_COMPANY = 'Non-Global Network Company'
+
+# Parsed 'Inspection Report Date' ("Apr. 26, 2024"), datetime64[ns]
+DATE_COLUMN = 'Report Date'
+_MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+           'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+
+def parse_report_dates(values):
+    """Parse report dates such as "Apr. 26, 2024", "May 23, 2019" or
+    "Sept. 5, 2012" into a datetime64[ns] Series; anything else becomes NaT.
+
+    Each distinct string is parsed once with vectorized string operations and
+    the result is broadcast back to the rows.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]')
+    codes, uniques = pd.factorize(values)
+    parts = pd.Series(uniques, dtype=object).astype(str).str.extract(
+        r'^\s*([A-Za-z]{3})[A-Za-z]*\.?\s+(\d{1,2}),?\s+(\d{4})\s*$')
+    parsed = pd.to_datetime(pd.DataFrame({
+        'year': pd.to_numeric(parts[2]),
+        'month': parts[0].str.lower().map(_MONTHS),
+        'day': pd.to_numeric(parts[1]),
+    }), errors='coerce')
+    # Missing values are coded -1 and pick the trailing NaT
+    dates = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(dates[codes], index=values.index)
+
+
+def preprocess(df):
+    """Apply the dashboard preprocessing to a freshly loaded frame."""
+    df['Inspection Year'] = df['Inspection Year'].astype(str)
+    if 'Part I.A Deficiency Rate' in df and not pd.api.types.is_numeric_dtype(df['Part I.A Deficiency Rate']):
+        df['Part I.A Deficiency Rate'] = df['Part I.A Deficiency Rate'].str.replace('%', '').astype(float)
+
+    # Resolve the scraped spellings of each firm to one firm id and display name
+    df[['Firm ID', 'Firm Name']] = resolve_firms(df['Inspection Report Company'], df['Country'])
+
+    # Some rows carry an inspection year in the 'Company' column instead of a global network. Take the
+    # network from the firm's other reports when it has one; otherwise it is a non-global network firm
+    misplaced_year = df['Company'].astype(str).str.fullmatch(r'\d{4}')
+    network = df['Company'].mask(misplaced_year)
+    firm_network = network.groupby(df['Firm ID']).transform('first').fillna(NON_GLOBAL_COMPANY)
+    df['Company'] = network.where(~misplaced_year, firm_network)
+
+    if 'Inspection Report Date' in df:
+        df[DATE_COLUMN] = parse_report_dates(df['Inspection Report Date'])
+
+    # Round float values to the nearest thousandths
+    float_columns = df.select_dtypes(include=['float64']).columns
+    df[float_columns] = df[float_columns].round(3)
+    return df
+
+
+def _read_source(path):
+    if path.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_parquet(path, engine='pyarrow')
+    return preprocess(df)
+
+
+def snapshot_path(path):
+    """Location of the preprocessed Arrow IPC snapshot for a source file."""
+    return os.path.splitext(path)[0] + '.arrow'
+
+
+def build_snapshot(path=DATA_PATH):
+    """Preprocess ``path`` and write it as an Arrow IPC snapshot next to it."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(_read_source(path), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'pcaob_snapshot_version': SNAPSHOT_VERSION.encode(),
+    })
+    target = snapshot_path(path)
+    with pa.OSFile(target + '.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(target + '.tmp', target)
+    return target
+
+
+def _read_snapshot(path):
+    # Returns None when there is no usable snapshot for the source file
+    target = snapshot_path(path)
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        return None
+    import pyarrow as pa
+
+    with pa.memory_map(target) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if (table.schema.metadata or {}).get(b'pcaob_snapshot_version') != SNAPSHOT_VERSION.encode():
+        return None
+    return table.to_pandas()
+
+
+@lru_cache(maxsize=4)
+def _load_data(path, mtime):
+    df = _read_snapshot(path)
+    return df if df is not None else _read_source(path)
+
+
+def load_data(path=DATA_PATH):
+    """Load and preprocess the inspection data, cached until the file changes.
+
+    The returned frame is shared between callers and reruns; filter it or copy
+    it rather than modifying it in place.
+    """
+    return _load_data(path, os.path.getmtime(path))
+
+
+class TimeIndex:
+    """Row positions of a frame sorted by date, for ``searchsorted`` range lookups.
+
+    Rows without a date are left out of every range.
+    """
+
+    def __init__(self, dates):
+        dates = pd.Series(dates).to_numpy(dtype='datetime64[ns]')
+        order = np.argsort(dates, kind='stable')
+        self.size = len(dates)
+        self.order = order[~np.isnat(dates[order])]
+        self.dates = dates[self.order]
+
+    def _bounds(self, start, end):
+        low = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+        high = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'ns'), 'right')
+        return low, high
+
+    def covers(self, start=None, end=None, rows=None):
+        """Whether ``[start, end]`` includes every dated row (of the boolean mask ``rows``, if given)."""
+        low, high = self._bounds(start, end)
+        if rows is None:
+            return low == 0 and high == len(self.dates)
+        return not (rows[self.order[:low]].any() or rows[self.order[high:]].any())
+
+    def indices(self, start=None, end=None):
+        """Positional indices of the rows dated within ``[start, end]``, in date order."""
+        low, high = self._bounds(start, end)
+        return self.order[low:high]
+
+    def mask(self, start=None, end=None):
+        """Boolean row mask of the rows dated within ``[start, end]``."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.indices(start, end)] = True
+        return mask
+
+    def rolling_mean(self, values, window_days=365, freq='QS', rows=None, groups=None):
+        """Mean of ``values`` over the trailing ``window_days`` at each ``freq`` date.
+
+        ``values`` and ``groups`` are aligned with the indexed frame and
+        ``rows`` limits the computation to those positions (a filter
+        selection). Each window sum is a difference of cumulative sums at two
+        ``searchsorted`` positions. Returns a frame with ``date``, ``group``,
+        ``mean`` and ``reports`` columns; windows without reports are dropped.
+        """
+        values = np.asarray(values, dtype=float)[self.order]
+        selected = ~np.isnan(values)
+        if rows is not None:
+            in_rows = np.zeros(self.size, dtype=bool)
+            in_rows[rows] = True
+            selected &= in_rows[self.order]
+        if groups is None:
+            codes, labels = np.zeros(len(self.order), dtype=np.int64), pd.Index([None])
+        else:
+            codes, labels = pd.factorize(pd.Series(groups).to_numpy()[self.order])
+            labels = pd.Index(labels)
+            selected &= codes >= 0
+        if not selected.any():
+            return pd.DataFrame(columns=['date', 'group', 'mean', 'reports'])
+
+        # Cumulative sums and counts per group, with a leading zero column
+        sums = np.zeros((len(labels), len(self.order) + 1))
+        counts = np.zeros((len(labels), len(self.order) + 1))
+        positions = np.flatnonzero(selected)
+        sums[codes[positions], positions + 1] = values[positions]
+        counts[codes[positions], positions + 1] = 1
+        sums, counts = sums.cumsum(axis=1), counts.cumsum(axis=1)
+
+        dated = self.dates[selected]
+        points = pd.date_range(dated[0], dated[-1], freq=freq).union([pd.Timestamp(dated[-1])]).to_numpy(dtype='datetime64[ns]')
+        high = np.searchsorted(self.dates, points, 'right')
+        low = np.searchsorted(self.dates, points - np.timedelta64(window_days, 'D'), 'right')
+        reports = counts[:, high] - counts[:, low]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (sums[:, high] - sums[:, low]) / reports
+        result = pd.DataFrame({
+            'date': np.tile(points, len(labels)),
+            'group': np.repeat(labels.to_numpy(), len(points)),
+            'mean': means.ravel(),
+            'reports': reports.ravel().astype(int),
+        })
+        return result[result['reports'] > 0].reset_index(drop=True)
+
+
+class CompiledFilter:
+    """Vectorized filter over a fixed frame.
+
+    Categorical columns are factorized once (other columns on first use), so
+    membership tests become a lookup into a small boolean table indexed by
+    integer codes. Numeric columns are held as float arrays for range
+    comparisons, and report date ranges are looked up in a ``TimeIndex``.
+    """
+
+    def __init__(self, df, data_token=None):
+        self.df = df
+        # Identifies the loaded data (source path and modification time) for caches keyed on selections
+        self.data_token = data_token
+        self._codes = {}
+        for column in CATEGORICAL_COLUMNS:
+            if column in df:
+                codes, uniques = pd.factorize(df[column])
+                self._codes[column] = (codes, pd.Index(uniques))
+        self._values = {}
+        for column in RANGE_COLUMNS:
+            if column in df:
+                self._values[column] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+        self.time_index = TimeIndex(df[DATE_COLUMN]) if DATE_COLUMN in df else None
+
+    def mask(self, isin=None, ranges=None, exclude=None):
+        """Boolean row mask for the given selections.
+
+        ``isin`` and ``exclude`` map a categorical column to the values to keep
+        or drop; an empty or missing selection leaves the column unfiltered.
+        ``ranges`` maps a numeric column, or ``DATE_COLUMN``, to an inclusive
+        ``(low, high)`` pair; a date range that covers every dated row the
+        other selections keep leaves the column unfiltered, so rows without a
+        parsed report date are kept until the range is narrowed.
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, values in (isin or {}).items():
+            if values:
+                mask &= self._lookup(column, values)
+        for column, values in (exclude or {}).items():
+            if values:
+                mask &= ~self._lookup(column, values)
+        ranges = dict(ranges or {})
+        dates = ranges.pop(DATE_COLUMN, None)
+        for column, (low, high) in ranges.items():
+            values = self._values[column]
+            mask &= (values >= low) & (values <= high)
+        # Last, so the range is compared with the rows the other selections keep (the dashboard's
+        # date slider spans only those, e.g. without the pre-2015 rows it hides by default)
+        if dates is not None and not self.time_index.covers(*dates, rows=mask):
+            mask &= self.time_index.mask(*dates)
+        return mask
+
+    def indices(self, isin=None, ranges=None, exclude=None):
+        """Positional row indices of the selected rows."""
+        return np.flatnonzero(self.mask(isin, ranges, exclude))
+
+    def apply(self, isin=None, ranges=None, exclude=None):
+        """Return the selected rows as a new frame."""
+        return self.df[self.mask(isin, ranges, exclude)]
+
+    def _lookup(self, column, values):
+        if column not in self._codes:
+            codes, uniques = pd.factorize(self.df[column])
+            self._codes[column] = (codes, pd.Index(uniques))
+        codes, uniques = self._codes[column]
+        # The trailing False catches missing values, which factorize codes as -1
+        table = np.append(uniques.isin(list(values)), False)
+        return table[codes]
+
+
+@lru_cache(maxsize=4)
+def _compiled_filter(path, mtime):
+    return CompiledFilter(_load_data(path, mtime), data_token=(path, mtime))
+
+
+def get_filter(path=DATA_PATH):
+    """Cached ``CompiledFilter`` over ``load_data(path)``."""
+    return _compiled_filter(path, os.path.getmtime(path))
+
+
+def dashboard_selection(inspection_types=None, years=None, countries=None, companies=None, firms=None,
+                        total_issuer_audit_clients=None, audits_reviewed=None, deficiency_rate=None,
+                        word_count=None, sentiment_range=None, report_dates=None, include_non_global=True,
+                        include_pre_2015=True):
+    """Translate the dashboard sidebar selections into ``CompiledFilter.mask`` arguments."""
+    isin = {
+        'Inspection Type': inspection_types,
+        'Inspection Year': years,
+        'Country': countries,
+        'Company': companies,
+        'Firm ID': firms,
+    }
+    ranges = {
+        'Total Issuer Audit Clients': total_issuer_audit_clients,
+        'Audits Reviewed': audits_reviewed,
+        'Part I.A Deficiency Rate': deficiency_rate,
+        'word_count': word_count,
+        'document_sentiment_score': sentiment_range,
+        DATE_COLUMN: report_dates,
+    }
+    if not include_pre_2015:
+        ranges['Inspection Year'] = (2015, np.inf)
+    exclude = {} if include_non_global else {'Company': [NON_GLOBAL_COMPANY]}
+    return {
+        'isin': isin,
+        'ranges': {column: bounds for column, bounds in ranges.items() if bounds is not None},
+        'exclude': exclude,
+    }
+
+
+# Aggregates shared by the dashboards and the API
+
+def key_metrics(df, sentiment_column='document_sentiment_score'):
+    """Total issuer audit clients, mean sentiment and mean word count."""
+    return {
+        'total_clients': df['Total Issuer Audit Clients'].sum(),
+        'avg_sentiment': df[sentiment_column].mean(),
+        'avg_word_count': df['word_count'].mean(),
+    }
+
+
+def clients_by_country(df):
+    """Total issuer audit clients per country (choropleth input)."""
+    return df.groupby('Country', sort=False)['Total Issuer Audit Clients'].sum().reset_index()
+
+
+def deficiency_by_year_company(df):
+    """Mean Part I.A deficiency rate per inspection year and company."""
+    return df.groupby(['Inspection Year', 'Company'], as_index=False)['Part I.A Deficiency Rate'].mean()
+
+
+def mean_word_count_by_company(df):
+    """Per-row mean word count of the row's company, rounded to two decimals."""
+    return df.groupby('Company')['word_count'].transform('mean').round(2)
+
+
+def rolling_deficiency(data_filter, rows=None, window_days=365, freq='QS', group_column='Company'):
+    """Trailing ``window_days`` mean Part I.A deficiency rate per group at each
+    ``freq`` date, over the selected ``rows`` of ``data_filter.df``."""
+    df = data_filter.df
+    rolling = data_filter.time_index.rolling_mean(df['Part I.A Deficiency Rate'], window_days=window_days,
+                                                  freq=freq, rows=rows, groups=df[group_column])
+    return rolling.rename(columns={'date': DATE_COLUMN, 'group': group_column,
+                                   'mean': 'Part I.A Deficiency Rate', 'reports': 'Reports'})
+
+
+def report_lag_stats(df, group_column='Company'):
+    """Days from the end of the inspection year to the report date, per group:
+    report count, median, 90th percentile and maximum."""
+    year_end = pd.to_datetime(df['Inspection Year'].astype(str) + '-12-31', format='%Y-%m-%d', errors='coerce')
+    lag = (df[DATE_COLUMN] - year_end).dt.days
+    grouped = lag.groupby(df[group_column])
+    return pd.DataFrame({
+        'reports': grouped.count(),
+        'median_days': grouped.median(),
+        'p90_days': grouped.quantile(0.9),
+        'max_days': grouped.max(),
+    }).reset_index()
+
+
+def firm_labels(df):
+    """Display label per firm id, "Firm Name (Country)", in name order."""
+    firms = df.drop_duplicates('Firm ID').sort_values(['Firm Name', 'Country'])
+    return pd.Series((firms['Firm Name'] + ' (' + firms['Country'] + ')').to_numpy(), index=firms['Firm ID'].to_numpy())
+
+
+def firm_search_text(df):
+    """Lower-case text per firm id covering its display name and every scraped spelling."""
+    return df.groupby('Firm ID')['Inspection Report Company'].agg(lambda names: ' | '.join(names.unique()).lower())
+
+
+def deficiency_by_year_firm(df):
+    """Mean Part I.A deficiency rate per inspection year and firm id, with the firm's label."""
+    aggregated = df.groupby(['Inspection Year', 'Firm ID'], as_index=False)['Part I.A Deficiency Rate'].mean()
+    aggregated['Firm'] = aggregated['Firm ID'].map(firm_labels(df))
+    return aggregated
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PCAOB data layer utilities')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    snapshot_parser = subparsers.add_parser('build-snapshot', help='write the preprocessed Arrow IPC startup snapshot')
+    snapshot_parser.add_argument('path', nargs='?', default=DATA_PATH)
+    snapshot_parser.add_argument('--record-version', action='store_true',
+                                 help='also record the data file as a version in the dataset_versions store')
+    args = parser.parse_args()
+
+    if args.command == 'build-snapshot':
+        if not os.path.exists(args.path):
+            parser.exit(0, f"{args.path} not found; skipping snapshot\n")
+        print(f"wrote {build_snapshot(args.path)}")
+        if args.record_version:
+            from dataset_versions import snapshot_file
+
+            print(f"recorded dataset version {snapshot_file(args.path)['id']}")
@@ -0,0 +1,370 @@
+"""Versioned, content-addressed snapshots of the inspection dataset.
+
+Every scrape overwrites ``data/PCAOB_inspection_reports.csv`` and the
+transformed parquet. ``snapshot`` records the current contents as an
+immutable version in a store directory (``DATASET_STORE_DIR``, default
+``dataset_versions``), and ``diff_versions`` reports which reports were added,
+removed or changed between two versions.
+
+Rows are identified by ``report_key``: the report PDF URL without its query
+string, so a re-published PDF (new ``sfvrsn``) is a changed row rather than a
+removed and an added one. Rows are stored sorted by that key and cut into
+row chunks at content-defined boundaries (where the key hash is a multiple
+of the average chunk size), so adding or removing a report only changes the
+chunk around it. Each column chunk is a compressed Arrow IPC file
+named by the SHA-256 of its contents and written only once, so column chunks
+that did not change between releases are shared by every version that
+contains them. ``manifest.json`` lists the versions with their chunk
+hashes and pandas metadata (the column dtypes), which the chunks themselves
+leave out so that a change to one column never rewrites the others.
+
+Diffs read only the two versions involved. A row chunk whose key chunk and
+column chunk both appear together in the older version cannot contain a
+change in that column, so only the remaining chunks are compared (columns
+without any are not even read), after joining the two versions on the key
+with vectorized index lookups. Diffing therefore stays fast however long the
+history gets and however large a release is, as long as it changes little.
+
+    python dataset_versions.py snapshot data/PCAOB_inspection_reports.csv --note "2024-05 scrape"
+    python dataset_versions.py list
+    python dataset_versions.py diff v1 v2
+"""
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.environ.get('DATASET_STORE_DIR', 'dataset_versions')
+KEY_COLUMN = 'report_key'
+LINK_COLUMNS = ['pdf_link', 'PDF Link']
+# Rows per chunk on average: a power of two, at least MIN_CHUNK_ROWS, aiming for at most
+# TARGET_CHUNKS chunks per column
+MIN_CHUNK_ROWS = 64
+TARGET_CHUNKS = 256
+
+
+def report_keys(df):
+    """Row keys: the report PDF URL without its query string.
+
+    Repeated URLs get a ``#n`` suffix so every key is unique.
+    """
+    link_column = next((column for column in LINK_COLUMNS if column in df), None)
+    if link_column is None:
+        raise ValueError(f"No report link column ({' or '.join(LINK_COLUMNS)}) to key the rows on")
+    keys = df[link_column].astype(str).str.split('?', n=1).str[0].str.lower()
+    occurrence = keys.groupby(keys).cumcount()
+    return keys.where(occurrence == 0, keys + '#' + occurrence.astype(str))
+
+
+def average_chunk_rows(n_rows):
+    """Average chunk size for a table of ``n_rows``.
+
+    Always a power of two, so the boundaries of a larger size are a subset of
+    those of a smaller one and versions on either side of a size step still
+    share most chunks.
+    """
+    size = MIN_CHUNK_ROWS
+    while n_rows > size * TARGET_CHUNKS:
+        size *= 2
+    return size
+
+
+def chunk_bounds(keys):
+    """Row offsets ``[0, ..., len(keys)]`` of content-defined chunks of sorted ``keys``.
+
+    A chunk ends after every row whose key hash is a multiple of the average
+    chunk size (and at most every four average sizes). Boundaries depend only
+    on the keys next to them, so an inserted row does not shift the chunks
+    after it.
+    """
+    average = average_chunk_rows(len(keys))
+    hashes = pd.util.hash_pandas_object(pd.Series(keys), index=False).to_numpy()
+    ends = np.flatnonzero(hashes % np.uint64(average) == 0) + 1
+    bounds = np.unique(np.concatenate([[0], ends, [len(keys)]]))
+    # Split chunks that ran longer than four average sizes without a boundary
+    split = [np.arange(start, end, 4 * average) for start, end in zip(bounds[:-1], bounds[1:])]
+    return np.concatenate(split + [[len(keys)]]).astype(int).tolist()
+
+
+class DatasetStore:
+    """Directory of content-addressed column chunks plus a version manifest."""
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.chunk_dir = os.path.join(directory, 'chunks')
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.lock_path = os.path.join(directory, 'manifest.lock')
+
+    def versions(self):
+        """Manifest entries of all versions, oldest first.
+
+        The parsed manifest is reused until the file changes; treat the
+        returned entries as read-only.
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return []
+        return _load_manifest(self.manifest_path, stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def version(self, version_id):
+        for entry in self.versions():
+            if entry['id'] == version_id:
+                return entry
+        raise KeyError(f"Unknown dataset version: {version_id!r}")
+
+    @contextmanager
+    def _locked(self):
+        # Serializes manifest updates across processes (e.g. a pipeline publish and a manual snapshot)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'w') as lock:
+            # Imported here so that importing the module (e.g. in the dashboard) works on any platform
+            try:
+                import fcntl
+            except ImportError:
+                # Windows: lock the file's first byte instead (retries for about 10 seconds)
+                import msvcrt
+
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+                return
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def snapshot(self, df, source=None, note=''):
+        """Store ``df`` as a new version and return its manifest entry.
+
+        If the contents equal the latest version, that version is returned
+        and nothing is written.
+        """
+        import pyarrow as pa
+
+        df = df.copy()
+        df[KEY_COLUMN] = report_keys(df)
+        df = df.sort_values(KEY_COLUMN, kind='stable').reset_index(drop=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        bounds = chunk_bounds(df[KEY_COLUMN])
+
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        columns = {}
+        for name in table.column_names:
+            # Without the table-wide pandas metadata, which names every column and its dtype, a
+            # column's chunks only change when that column does; the metadata goes in the manifest
+            column = table.select([name]).replace_schema_metadata(None)
+            columns[name] = [self._write_chunk(column.slice(start, end - start))
+                             for start, end in zip(bounds[:-1], bounds[1:])]
+        pandas_metadata = table.schema.pandas_metadata
+
+        content_hash = hashlib.sha256(
+            json.dumps([bounds, columns, pandas_metadata], sort_keys=True).encode()).hexdigest()
+        with self._locked():
+            versions = self.versions()
+            if versions and versions[-1]['content_hash'] == content_hash:
+                return versions[-1]
+            entry = {
+                'id': f"v{len(versions) + 1}",
+                'content_hash': content_hash,
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'source': source,
+                'note': note,
+                'rows': len(df),
+                'bounds': bounds,
+                'columns': columns,
+                'pandas_metadata': pandas_metadata,
+            }
+            self._write_manifest(versions + [entry])
+        return entry
+
+    def _write_chunk(self, table):
+        import pyarrow as pa
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+        data = sink.getvalue().to_pybytes()
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.chunk_dir, digest + '.arrow')
+        # Chunks are immutable: an existing file with this name already holds these bytes
+        if not os.path.exists(path):
+            # A unique temporary name, since concurrent snapshots may write the same chunk
+            fd, partial = tempfile.mkstemp(dir=self.chunk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as output:
+                output.write(data)
+            os.replace(partial, path)
+        return digest
+
+    def _write_manifest(self, versions):
+        with open(self.manifest_path + '.tmp', 'w') as manifest:
+            json.dump({'versions': versions}, manifest, indent=1)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def read(self, version_id, columns=None):
+        """Frame of a stored version (sorted by ``report_key``), optionally only ``columns``."""
+        entry = self.version(version_id)
+        return _read_version(self.directory, version_id, entry['content_hash'],
+                             tuple(columns) if columns is not None else None).copy()
+
+    def _read_column(self, hashes):
+        import pyarrow as pa
+
+        pieces = []
+        for digest in hashes:
+            with pa.memory_map(os.path.join(self.chunk_dir, digest + '.arrow')) as source:
+                pieces.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(pieces)
+
+
+@lru_cache(maxsize=4)
+def _load_manifest(path, mtime_ns, size, inode):
+    # Keyed on the file's identity, so a rewritten manifest is parsed again
+    with open(path) as manifest:
+        return json.load(manifest)['versions']
+
+
+@lru_cache(maxsize=8)
+def _read_version(directory, version_id, content_hash, columns):
+    # Versions are immutable, so a version read once can be reused by later diffs; the content
+    # hash is part of the cache key in case the store is rebuilt and version ids are reused
+    import pyarrow as pa
+
+    store = DatasetStore(directory)
+    entry = store.version(version_id)
+    names = list(entry['columns']) if columns is None else [name for name in columns if name in entry['columns']]
+    tables = [store._read_column(entry['columns'][name]) for name in names]
+    arrays = [table.column(0) for table in tables]
+    metadata = {b'pandas': json.dumps(entry['pandas_metadata'])} if entry.get('pandas_metadata') else None
+    return pa.Table.from_arrays(arrays, names=names, metadata=metadata).to_pandas()
+
+
+def _differs(old, new):
+    # Element-wise inequality that treats two missing values as equal
+    old_missing, new_missing = pd.isna(old), pd.isna(new)
+    with np.errstate(invalid='ignore'):
+        equal = np.asarray(old == new, dtype=bool)
+    return ~(equal | (old_missing & new_missing))
+
+
+@lru_cache(maxsize=32)
+def _diff(directory, old_id, old_hash, new_id, new_hash):
+    store = DatasetStore(directory)
+    old_entry, new_entry = store.version(old_id), store.version(new_id)
+    shared = [name for name in new_entry['columns'] if name in old_entry['columns'] and name != KEY_COLUMN]
+
+    # Rows of the new version that sit in a chunk whose (key chunk, column chunk) pair does not
+    # occur in the old version; every other row holds the same keys with the same values
+    chunk_rows = np.diff(new_entry['bounds'])
+    dirty = {}
+    for name in shared:
+        old_pairs = set(zip(old_entry['columns'][KEY_COLUMN], old_entry['columns'][name]))
+        flags = np.array([pair not in old_pairs
+                          for pair in zip(new_entry['columns'][KEY_COLUMN], new_entry['columns'][name])], dtype=bool)
+        if flags.any():
+            dirty[name] = np.repeat(flags, chunk_rows)
+    compared = list(dirty)
+
+    old_df = _read_version(directory, old_id, old_hash, tuple([KEY_COLUMN] + compared))
+    new_df = _read_version(directory, new_id, new_hash, tuple([KEY_COLUMN] + compared))
+    old_keys, new_keys = pd.Index(old_df[KEY_COLUMN]), pd.Index(new_df[KEY_COLUMN])
+    old_positions = old_keys.get_indexer(new_keys)
+    added = old_positions == -1
+    removed = new_keys.get_indexer(old_keys) == -1
+    common_new = np.flatnonzero(~added)
+    common_old = old_positions[common_new]
+
+    changes = []
+    for name in compared:
+        checked = dirty[name][common_new]
+        new_rows, old_rows = common_new[checked], common_old[checked]
+        old_values = old_df[name].to_numpy(dtype=object)[old_rows]
+        new_values = new_df[name].to_numpy(dtype=object)[new_rows]
+        rows = np.flatnonzero(_differs(old_values, new_values))
+        if len(rows):
+            changes.append(pd.DataFrame({
+                KEY_COLUMN: new_keys[new_rows[rows]],
+                'column': name,
+                'old': old_values[rows],
+                'new': new_values[rows],
+            }))
+    changed = (pd.concat(changes, ignore_index=True) if changes
+               else pd.DataFrame(columns=[KEY_COLUMN, 'column', 'old', 'new']))
+    return {
+        'old': old_id,
+        'new': new_id,
+        'added': new_keys[added].tolist(),
+        'removed': old_keys[removed].tolist(),
+        'changed': changed,
+        'unchanged_columns': [name for name in shared if name not in compared],
+        'added_columns': [name for name in new_entry['columns'] if name not in old_entry['columns']],
+        'removed_columns': [name for name in old_entry['columns'] if name not in new_entry['columns']],
+    }
+
+
+def diff_versions(old_id, new_id, store=None, versions=None):
+    """What changed from version ``old_id`` to ``new_id``.
+
+    ``versions`` may pass the store's already loaded ``versions()``. Returns a
+    dict with the ``added`` and ``removed`` report keys, a long-form
+    ``changed`` frame (``report_key``, ``column``, ``old``, ``new``; one row per
+    changed cell), the columns skipped because their chunks are identical
+    (``unchanged_columns``) and the columns only present in one version.
+    """
+    store = store or DatasetStore()
+    entries = {entry['id']: entry for entry in (versions if versions is not None else store.versions())}
+    for version_id in (old_id, new_id):
+        if version_id not in entries:
+            raise KeyError(f"Unknown dataset version: {version_id!r}")
+    result = _diff(store.directory, old_id, entries[old_id]['content_hash'],
+                   new_id, entries[new_id]['content_hash'])
+    return {**result, 'changed': result['changed'].copy()}
+
+
+def snapshot_file(path, store=None, note=''):
+    """Snapshot a CSV or parquet data file as it is on disk (before preprocessing)."""
+    df = pd.read_csv(path) if path.endswith('.csv') else pd.read_parquet(path, engine='pyarrow')
+    return (store or DatasetStore()).snapshot(df, source=path, note=note)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Versioned dataset snapshots')
+    parser.add_argument('--store', default=STORE_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    snapshot_parser = subparsers.add_parser('snapshot', help='record a data file as a new version')
+    snapshot_parser.add_argument('path', nargs='?', default='data/PCAOB_inspection_reports.csv')
+    snapshot_parser.add_argument('--note', default='')
+    subparsers.add_parser('list', help='list the stored versions')
+    diff_parser = subparsers.add_parser('diff', help='summarize the changes between two versions')
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new', nargs='?', help='defaults to the latest version')
+    args = parser.parse_args()
+
+    dataset_store = DatasetStore(args.store)
+    if args.command == 'snapshot':
+        entry = snapshot_file(args.path, dataset_store, note=args.note)
+        print(f"{entry['id']}: {entry['rows']} rows, content {entry['content_hash'][:12]}")
+    elif args.command == 'list':
+        for entry in dataset_store.versions():
+            print(f"{entry['id']:>5}  {entry['created']}  {entry['rows']:>7} rows  {entry['source'] or ''}  {entry['note']}")
+    elif args.command == 'diff':
+        diff = diff_versions(args.old, args.new or dataset_store.latest()['id'], dataset_store)
+        print(f"{diff['old']} -> {diff['new']}: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+              f"{diff['changed'][KEY_COLUMN].nunique()} changed reports ({len(diff['changed'])} cells)")
+        for name, group in diff['changed'].groupby('column'):
+            print(f"  {name}: {len(group)} changed")
@@ -0,0 +1,141 @@
+"""Streaming export of the filtered inspection data.
+
+Exports are produced from the positional row indices of a filter selection
+(``CompiledFilter.indices``). Rows are taken from the loaded frame one chunk
+at a time and encoded straight into the output, so neither the filtered frame
+nor the encoded file is ever held in memory as a whole. Each ``iter_*``
+function yields ``bytes`` pieces that can be written to a file or sent as a
+streaming HTTP response.
+"""
+import io
+
+import numpy as np
+
+# Rows encoded per chunk; also the Parquet row group size
+CHUNK_ROWS = 10000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file object that collects whatever pyarrow wrote since the last drain
+    def __init__(self):
+        self._pieces = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._pieces.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._pieces)
+        self._pieces = []
+        return data
+
+
+def _select(frame, columns):
+    # Only ever applied to a chunk or an empty head: selecting columns of the whole frame copies them
+    return frame if columns is None else frame[columns]
+
+
+def _chunks(df, indices, columns, chunk_rows):
+    indices = np.asarray(indices)
+    for start in range(0, len(indices), chunk_rows):
+        yield _select(df.iloc[indices[start:start + chunk_rows]], columns)
+
+
+def _schema(df, columns):
+    import pyarrow as pa
+
+    # Inferred from the whole frame, since an empty object column has no type to infer
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    if columns is None:
+        return schema
+    return pa.schema([schema.field(name) for name in columns])
+
+
+def iter_csv(df, indices, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield the selected rows of ``df`` as UTF-8 CSV."""
+    header = _select(df.head(0), columns).to_csv(index=False)
+    yield header.encode('utf-8')
+    for chunk in _chunks(df, indices, columns, chunk_rows):
+        yield chunk.to_csv(index=False, header=False).encode('utf-8')
+
+
+def iter_parquet(df, indices, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield the selected rows of ``df`` as a Parquet file, one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema(df, columns)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for chunk in _chunks(df, indices, columns, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_arrow(df, indices, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield the selected rows of ``df`` in the Arrow IPC streaming format."""
+    import pyarrow as pa
+
+    schema = _schema(df, columns)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for chunk in _chunks(df, indices, columns, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+_ENCODERS = {'csv': iter_csv, 'parquet': iter_parquet, 'arrow': iter_arrow}
+
+
+def iter_export(df, indices, export_format, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield the selected rows of ``df`` encoded as ``export_format``."""
+    if export_format not in _ENCODERS:
+        raise ValueError(f"Unsupported export format: {export_format!r}")
+    for piece in _ENCODERS[export_format](df, indices, columns, chunk_rows):
+        if piece:
+            yield piece
+
+
+def export_filename(export_format, stem='pcaob_inspections'):
+    """Download file name for an export format."""
+    return f"{stem}.{EXPORT_FORMATS[export_format][1]}"
+
+
+class ExportStream(io.RawIOBase):
+    """Read-only file object over ``iter_export``, for APIs that want a file."""
+
+    def __init__(self, pieces):
+        self._pieces = iter(pieces)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._pieces)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
@@ -0,0 +1,207 @@
+"""Entity resolution for the inspected firm names.
+
+``Inspection Report Company`` holds the firm name as scraped from each report,
+so one firm shows up under several spellings across years ("KPMG Audit Plc" /
+"KPMG Audit plc", "Ernst & Young LLP (2009 Inspection)", accented and
+unaccented forms, ...). ``resolve_firms`` assigns every row a stable firm id
+and a canonical display name at ingest time.
+
+Names are normalized (accents, case, punctuation, legal forms and
+parenthesized inspection notes removed) and firms in different countries are
+never merged. Instead of comparing every pair of names, candidate pairs come
+from a blocking index: two names are compared only if they share a
+distinctive token within the same country, and tokens shared by more than
+``max_block_size`` names are not used for blocking. Candidates are scored in
+one vectorized pass with the cosine similarity of character trigrams,
+weighted by the IDF of the token they come from among the names of the same
+country, and pairs above ``threshold`` are merged into connected components.
+"""
+import hashlib
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+SIMILARITY_THRESHOLD = 0.75
+MAX_BLOCK_SIZE = 50
+
+# Tokens that do not identify a firm: legal forms and connectives
+LEGAL_FORM_TOKENS = frozenset([
+    'ab', 'ag', 'and', 'as', 'bv', 'co', 'corp', 'corporation', 'de', 'inc', 'incorporated', 'limitada',
+    'limited', 'llc', 'llp', 'ltd', 'ltda', 'nv', 'plc', 'sa', 'sas', 'sl', 'srl', 'ss', 'y',
+])
+
+
+def normalize_firm_names(names):
+    """Comparison keys for firm names: lower-case ASCII without punctuation,
+    legal forms or parenthesized notes such as "(2009 Inspection)"."""
+    names = pd.Series(names, dtype=object).fillna('').astype(str)
+    keys = (names.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
+            .str.replace(r'\([^)]*\)', ' ', regex=True)
+            # Drop abbreviation dots and slashes so "S.A." and "S/S" become single tokens
+            .str.replace(r"[./']", '', regex=True)
+            .str.replace(r'[^a-z0-9]+', ' ', regex=True)
+            .str.strip()
+            # Join runs of single letters left by spaced abbreviations ("s a" -> "sa")
+            .str.replace(r'\b([a-z]) (?=[a-z]\b)', r'\1', regex=True))
+    stripped = keys.map(lambda key: ' '.join(token for token in key.split() if token not in LEGAL_FORM_TOKENS))
+    # A name made only of legal forms keeps its full key
+    return stripped.where(stripped != '', keys)
+
+
+def _ragged_arange(starts, lengths):
+    # Concatenation of arange(start, start + length) for each pair, without a Python loop
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(np.asarray(starts, dtype=np.int64), lengths) + np.arange(total) - offsets
+
+
+def _trigram_vectors(keys, blocks):
+    """CSR-style weighted character trigram sets for each key.
+
+    Every token of a key contributes its trigrams with a total squared weight
+    equal to the token's squared IDF within the key's block, so a word that
+    most firms of a country share ("auditores") counts less than a
+    distinctive one ("azsa") regardless of its length, while a misspelled
+    token still shares most of its trigrams. Returns ``(offsets, grams,
+    weights, norms, vocabulary_size)``; record ``i`` owns
+    ``grams[offsets[i]:offsets[i + 1]]`` (sorted) and the matching weights.
+    """
+    tokenized = [key.split() for key in keys]
+    block_sizes = Counter(blocks)
+    token_frequency = Counter((block, token) for block, tokens in zip(blocks, tokenized) for token in set(tokens))
+
+    vocabulary = {}
+    records, grams, weights = [], [], []
+    for record, (block, tokens) in enumerate(zip(blocks, tokenized)):
+        for token in tokens:
+            idf = math.log((1 + block_sizes[block]) / (1 + token_frequency[(block, token)])) + 1
+            padded = f" {token} "
+            token_grams = [vocabulary.setdefault(padded[k:k + 3], len(vocabulary)) for k in range(len(padded) - 2)]
+            records.extend([record] * len(token_grams))
+            grams.extend(token_grams)
+            weights.extend([idf / math.sqrt(len(token_grams))] * len(token_grams))
+    records = np.asarray(records, dtype=np.int64)
+    grams = np.asarray(grams, dtype=np.int64)
+    weights = np.asarray(weights, dtype=float)
+
+    # One entry per (record, trigram), keeping the largest weight when tokens repeat a trigram
+    order = np.lexsort((-weights, grams, records))
+    records, grams, weights = records[order], grams[order], weights[order]
+    first = np.ones(len(records), dtype=bool)
+    first[1:] = (records[1:] != records[:-1]) | (grams[1:] != grams[:-1])
+    records, grams, weights = records[first], grams[first], weights[first]
+
+    norms = np.sqrt(np.bincount(records, weights * weights, minlength=len(keys)))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(records, minlength=len(keys)))])
+    return offsets, grams, weights, norms, len(vocabulary)
+
+
+def candidate_pairs(keys, blocks, max_block_size=MAX_BLOCK_SIZE):
+    """Pairs ``(left, right)`` of record positions, ``left < right``, that share
+    a token of their key within the same block (country)."""
+    block_keys = [(block, token) for block, key in zip(blocks, keys) for token in set(key.split())]
+    if not block_keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    records = np.repeat(np.arange(len(keys)), [len(set(key.split())) for key in keys])
+    codes = pd.factorize(pd.Series(block_keys, dtype=object))[0]
+
+    order = np.argsort(codes, kind='stable')
+    records, codes = records[order], codes[order]
+    sizes = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    # Blocks of one name produce no pairs; very common tokens are not distinctive enough to block on
+    usable = (sizes >= 2) & (sizes <= max_block_size)
+
+    # Pair every entry with the entries after it in the same block
+    entry_block = codes
+    entry_position = np.arange(len(codes))
+    keep = usable[entry_block]
+    entry_block, entry_position = entry_block[keep], entry_position[keep]
+    block_end = starts[entry_block] + sizes[entry_block]
+    later = block_end - entry_position - 1
+    left = np.repeat(records[entry_position], later)
+    right = records[_ragged_arange(entry_position + 1, later)]
+
+    left, right = np.minimum(left, right), np.maximum(left, right)
+    pair_codes = np.unique(left[left != right] * len(keys) + right[left != right])
+    return pair_codes // len(keys), pair_codes % len(keys)
+
+
+def pair_similarity(keys, blocks, left, right):
+    """Cosine similarity of the weighted character trigram sets of
+    ``keys[left[p]]`` and ``keys[right[p]]`` for every pair ``p``."""
+    offsets, grams, weights, norms, vocabulary_size = _trigram_vectors(keys, blocks)
+    lengths = np.diff(offsets)
+    pairs = np.arange(len(left), dtype=np.int64)
+
+    # Expand each pair into (pair, gram) entries for both sides and join them on that key
+    left_entries = _ragged_arange(offsets[left], lengths[left])
+    right_entries = _ragged_arange(offsets[right], lengths[right])
+    left_keys = np.repeat(pairs, lengths[left]) * vocabulary_size + grams[left_entries]
+    right_keys = np.repeat(pairs, lengths[right]) * vocabulary_size + grams[right_entries]
+    shared, left_index, right_index = np.intersect1d(left_keys, right_keys, assume_unique=True,
+                                                     return_indices=True)
+    dot = np.bincount(shared // vocabulary_size,
+                      weights[left_entries[left_index]] * weights[right_entries[right_index]],
+                      minlength=len(left))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nan_to_num(dot / (norms[left] * norms[right]))
+
+
+def connected_components(n, left, right):
+    """Component label (smallest member position) of each of ``n`` nodes."""
+    labels = np.arange(n)
+    while True:
+        smallest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, smallest)
+        np.minimum.at(updated, right, smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def resolve_firms(names, countries, threshold=SIMILARITY_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+    """Stable firm id and canonical name for each (firm name, country) row.
+
+    Returns a frame aligned with ``names`` with ``Firm ID`` and ``Firm Name``
+    columns. The id is a hash of the country and the alphabetically first
+    normalized name of the firm, so it does not depend on row order and only
+    changes if a newly ingested spelling sorts before the existing ones. The
+    canonical name is the firm's most frequent raw spelling.
+    """
+    names = pd.Series(names, dtype=object).fillna('').astype(str)
+    countries = pd.Series(countries, index=names.index, dtype=object).fillna('').astype(str).to_numpy()
+    rows = pd.DataFrame({'country': countries, 'key': normalize_firm_names(names).to_numpy()})
+
+    # Resolve each distinct (country, normalized name) once
+    record_codes, records = pd.MultiIndex.from_frame(rows).factorize()
+    record_countries = records.get_level_values(0).to_numpy(dtype=object)
+    record_keys = records.get_level_values(1).to_numpy(dtype=object)
+    left, right = candidate_pairs(record_keys, record_countries, max_block_size)
+    if len(left):
+        similar = pair_similarity(record_keys, record_countries, left, right) >= threshold
+        left, right = left[similar], right[similar]
+    components = connected_components(len(records), left, right)
+
+    # Alphabetically first key of each component anchors its id
+    alphabetical = np.argsort(record_keys)
+    rank = np.empty(len(records), dtype=np.int64)
+    rank[alphabetical] = np.arange(len(records))
+    first_rank = np.full(len(records), len(records))
+    np.minimum.at(first_rank, components, rank)
+    anchors = record_keys[alphabetical[first_rank[components]]]
+    record_ids = np.array([hashlib.sha1(f"{country}|{anchor}".encode()).hexdigest()[:12]
+                           for country, anchor in zip(record_countries, anchors)], dtype=object)
+    firm_ids = pd.Series(record_ids[record_codes], index=names.index)
+
+    counts = pd.DataFrame({'firm': firm_ids, 'name': names}).value_counts().reset_index(name='count')
+    counts = counts.sort_values(['firm', 'count', 'name'], ascending=[True, False, True])
+    canonical = counts.drop_duplicates('firm').set_index('firm')['name']
+    return pd.DataFrame({'Firm ID': firm_ids, 'Firm Name': firm_ids.map(canonical)}, index=names.index)
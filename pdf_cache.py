@@ -0,0 +1,288 @@
+"""Local caching proxy for PCAOB inspection report PDFs.
+
+Each report is downloaded from ``assets.pcaobus.org`` once and stored on disk
+under a key derived from its URL path and ``sfvrsn`` version, so a new
+revision of a report is a new cache entry while repeat requests are served
+locally. The cache is bounded in size and evicts least recently used files.
+
+``router`` mounts the proxy on a FastAPI app (``app.py`` serves it under
+``/pdfs``). Files are served with HTTP range support, using the ASGI
+zero-copy send extension when the server offers it. ``python pdf_cache.py
+prefetch`` warms the cache concurrently from the scraped report list.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+
+CACHE_DIR = os.environ.get('PDF_CACHE_DIR', 'pdf_cache')
+CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+ALLOWED_HOSTS = {'assets.pcaobus.org', 'pcaobus.org'}
+REPORTS_CSV = 'data/PCAOB_inspection_reports.csv'
+USER_AGENT = 'Mozilla/5.0 (compatible; PCAOB-Insight-Analytics PDF cache)'
+
+
+def _check_url(url):
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or parts.hostname not in ALLOWED_HOSTS:
+        raise ValueError(f"Not a PCAOB report URL: {url!r}")
+    return parts
+
+
+class _AllowedHostsRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Follow redirects only to the allowed hosts
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        try:
+            _check_url(newurl)
+        except ValueError:
+            raise urllib.error.HTTPError(newurl, code, f"Redirect to a disallowed host: {newurl}", headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_AllowedHostsRedirectHandler)
+
+
+class PDFCache:
+    """Size-bounded, LRU-evicted on-disk cache of report PDFs."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, timeout=60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+        # Files being served; eviction skips them until they are unpinned
+        self._pins = Counter()
+        self._pins_guard = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url):
+        """Cache key for a report URL: its host and path plus the ``sfvrsn`` version."""
+        parts = _check_url(url)
+        version = urllib.parse.parse_qs(parts.query).get('sfvrsn', [''])[0]
+        return hashlib.sha256(f"{parts.hostname}{parts.path}|{version}".encode()).hexdigest()
+
+    def path(self, url):
+        return os.path.join(self.directory, self.key(url) + '.pdf')
+
+    def get(self, url, pin=False):
+        """Local path of the report at ``url``, downloading it on a miss.
+
+        With ``pin=True`` the file is not evicted until ``unpin(path)`` is called.
+        """
+        target = self.path(url)
+        if pin:
+            # Pinned before the existence check, so eviction cannot remove the file after it
+            self._pin(target)
+        try:
+            with self._lock_for(target):
+                if os.path.exists(target):
+                    # Bump the modification time; eviction removes the least recently used files first
+                    os.utime(target)
+                    return target
+                self._download(url, target)
+        except BaseException:
+            if pin:
+                self.unpin(target)
+            self._drop_lock(target)
+            raise
+        self.evict(keep=target)
+        return target
+
+    def _pin(self, path):
+        with self._pins_guard:
+            self._pins[path] += 1
+
+    def unpin(self, path):
+        with self._pins_guard:
+            self._pins[path] -= 1
+            if self._pins[path] <= 0:
+                del self._pins[path]
+
+    def _lock_for(self, target):
+        with self._locks_guard:
+            return self._locks.setdefault(target, threading.Lock())
+
+    def _drop_lock(self, target):
+        # Forget the lock of an entry that is no longer cached, unless a download of it is in progress
+        with self._locks_guard:
+            lock = self._locks.get(target)
+            if lock is not None and not lock.locked():
+                del self._locks[target]
+
+    def _download(self, url, target):
+        request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        fd, partial = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as output, _opener.open(request, timeout=self.timeout) as response:
+                while True:
+                    block = response.read(1 << 16)
+                    if not block:
+                        break
+                    output.write(block)
+            os.replace(partial, target)
+        except BaseException:
+            os.unlink(partial)
+            raise
+
+    def evict(self, keep=None):
+        """Remove least recently used files until the cache fits in ``max_bytes``."""
+        with self._evict_lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                with self._pins_guard:
+                    if self._pins[path]:
+                        continue
+                    try:
+                        os.unlink(path)
+                        total -= size
+                    except FileNotFoundError:
+                        pass
+                self._drop_lock(path)
+
+    def prefetch(self, urls, workers=8):
+        """Download every URL not yet cached, ``workers`` at a time.
+
+        Returns ``(fetched, cached, failed)`` counts.
+        """
+        urls = list(dict.fromkeys(urls))
+        pending = [url for url in urls if not os.path.exists(self.path(url))]
+        failed = []
+
+        def fetch(url):
+            try:
+                self.get(url)
+            except (OSError, ValueError) as error:
+                failed.append((url, error))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fetch, pending))
+        return len(pending) - len(failed), len(urls) - len(pending), failed
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """``FileResponse`` that sends the whole file or a single byte range with
+    the ASGI ``http.response.zerocopysend`` extension when the server supports
+    it, and falls back to Starlette's own range handling otherwise.
+
+    ``on_close`` is called once the response is done, whether or not it was
+    sent completely.
+    """
+
+    def __init__(self, *args, on_close=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self._respond(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    async def _respond(self, scope, receive, send):
+        headers = Headers(scope=scope)
+        if ('http.response.zerocopysend' not in scope.get('extensions', {})
+                or scope.get('method') == 'HEAD' or 'if-range' in headers):
+            return await super().__call__(scope, receive, send)
+
+        size = os.stat(self.path).st_size
+        start, end, status = 0, size, self.status_code
+        response_headers = [(name, value) for name, value in self.raw_headers if name != b'content-length']
+        if 'range' in headers:
+            try:
+                ranges = self._parse_range_header(headers['range'], size)
+            except Exception:
+                ranges = []
+            if len(ranges) != 1:
+                return await super().__call__(scope, receive, send)
+            start, end = ranges[0]
+            status = 206
+            response_headers.append((b'content-range', f'bytes {start}-{end - 1}/{size}'.encode()))
+        response_headers.append((b'content-length', str(end - start).encode()))
+
+        with open(self.path, 'rb') as file:
+            await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+            await send({'type': 'http.response.zerocopysend', 'file': file, 'offset': start,
+                        'count': end - start, 'more_body': False})
+
+
+_cache = None
+
+
+def get_cache():
+    """Process-wide ``PDFCache`` configured from the environment."""
+    global _cache
+    if _cache is None:
+        _cache = PDFCache()
+    return _cache
+
+
+router = APIRouter()
+
+
+@router.get('/report')
+def read_report(url: str = Query(..., description='pdf_link of the report on assets.pcaobus.org')):
+    # Serve a report PDF from the local cache, fetching it on first request
+    cache = get_cache()
+    try:
+        # Pinned so a concurrent eviction cannot remove the file while it is being sent
+        path = cache.get(url, pin=True)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except OSError as error:
+        raise HTTPException(status_code=502, detail=f"Could not fetch report: {error}")
+    return ZeroCopyFileResponse(path, media_type='application/pdf', stat_result=os.stat(path),
+                                content_disposition_type='inline',
+                                filename=os.path.basename(urllib.parse.urlsplit(url).path),
+                                on_close=lambda: cache.unpin(path))
+
+
+def read_report_urls(csv_path=REPORTS_CSV, column='PDF Link'):
+    """Report URLs listed in the scraped reports CSV."""
+    import csv
+
+    with open(csv_path, newline='', encoding='utf-8') as reports:
+        return [row[column] for row in csv.DictReader(reports) if row.get(column)]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PCAOB report PDF cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    prefetch_parser = subparsers.add_parser('prefetch', help='download all listed reports into the cache')
+    prefetch_parser.add_argument('csv_path', nargs='?', default=REPORTS_CSV)
+    prefetch_parser.add_argument('--column', default='PDF Link')
+    prefetch_parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == 'prefetch':
+        urls = read_report_urls(args.csv_path, args.column)
+        start = time.perf_counter()
+        fetched, cached, failed = get_cache().prefetch(urls, workers=args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"{fetched} fetched, {cached} already cached, {len(failed)} failed in {elapsed:.1f} s")
+        for url, error in failed:
+            print(f"  failed: {url}: {error}")
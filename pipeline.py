@@ -0,0 +1,481 @@
+"""Command-line runner for the end-to-end data refresh.
+
+The refresh is declared as a DAG of stages:
+
+    scrape -> download -> extract -> score -> transform -> publish
+
+- ``scrape`` runs ``extracting_pdf_links.ipynb``. It only does so with ``--scrape``; otherwise the existing ``data/PCAOB_inspection_reports.csv`` is used as is.
+- ``download`` fills the ``pdf_cache`` with the listed report PDFs.
+- ``extract`` pulls the text out of each PDF.
+- ``score`` computes each report's ``word_count`` and ``document_sentiment_score``.
+- ``transform`` joins the scores onto the scraped rows, sets their Inspection Type (``--inspection-types`` lists types for the reports it cannot infer) and writes ``final_transformed_data_compressed.parquet``.
+- ``publish`` builds the dashboard's startup snapshot and records the file as a ``dataset_versions`` version.
+
+A stage starts as soon as the stages it depends on have finished. The per-report work inside download, extract and score runs on a pool of ``--workers`` threads or processes.
+
+Each stage has a fingerprint: the SHA-256 of its input files, its parameters and its code version. A stage is skipped when its fingerprint and output files match its last successful run. Extract and score also keep their per-report results keyed by content, so a new release only processes the reports that changed. Each run appends the per-stage timings and throughput to ``pipeline_work/runs.jsonl``.
+
+    python pipeline.py run --workers 8
+    python pipeline.py run --scrape --scorer my_models:finbert_score
+    python pipeline.py run transform --force
+    python pipeline.py status
+    python pipeline.py history --last 5
+"""
+import datetime
+import hashlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import pandas as pd
+
+from data_layer import DATA_PATH, build_snapshot, snapshot_path
+from dataset_versions import report_keys, snapshot_file
+from pdf_cache import REPORTS_CSV, get_cache, read_report_urls
+
+WORK_DIR = os.environ.get('PIPELINE_WORK_DIR', 'pipeline_work')
+SCRAPE_NOTEBOOK = 'extracting_pdf_links.ipynb'
+# "module:function" taking a report's text and returning its sentiment score
+DEFAULT_SCORER = os.environ.get('PIPELINE_SCORER', 'pipeline:vader_score')
+# Firms that audit more than 100 issuers are inspected annually, the others at least every three years
+ANNUAL_INSPECTION_THRESHOLD = 100
+# Inspection Type of new reports whose issuer audit client count is missing
+UNKNOWN_INSPECTION_TYPE = 'Unknown'
+# CSV of "PDF Link,Inspection Type" rows that set the type of the listed reports
+INSPECTION_TYPES_PATH = os.environ.get('PIPELINE_INSPECTION_TYPES', 'data/inspection_types.csv')
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_json(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w') as output:
+        json.dump(data, output, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+class Stage:
+    """One step of the refresh.
+
+    ``run(pipeline)`` does the work and returns a dict with the number of
+    ``items`` (reports) it covers, how many it ``processed`` rather than
+    reused, and how many ``failed``. ``inputs`` and ``outputs`` map the
+    pipeline to the files the stage reads and writes. ``params`` name the
+    pipeline attributes that change its result. Bump ``version`` when the
+    stage's code changes its output.
+    """
+
+    def __init__(self, name, run, deps=(), inputs=lambda pipeline: [], outputs=lambda pipeline: [],
+                 params=(), version=1, cacheable=lambda pipeline: True):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = tuple(params)
+        self.version = version
+        self.cacheable = cacheable
+
+
+def run_scrape(pipeline):
+    if pipeline.scrape:
+        # The notebook runs in its own directory and writes the CSV there
+        notebook = os.path.abspath(SCRAPE_NOTEBOOK)
+        subprocess.run([sys.executable, '-m', 'jupyter', 'nbconvert', '--to', 'notebook', '--execute',
+                        '--output-dir', os.path.abspath(pipeline.work_dir), notebook], check=True)
+        os.replace(os.path.join(os.path.dirname(notebook), os.path.basename(pipeline.csv_path)), pipeline.csv_path)
+    rows = len(pd.read_csv(pipeline.csv_path))
+    return {'items': rows, 'processed': rows if pipeline.scrape else 0}
+
+
+def run_download(pipeline):
+    cache = get_cache()
+    urls = list(dict.fromkeys(read_report_urls(pipeline.csv_path)))
+    fetched, _, failed = cache.prefetch(urls, workers=pipeline.workers)
+    for url, error in failed:
+        print(f"  download failed: {url}: {error}")
+    failed_urls = {url for url, _ in failed}
+    _write_json(pipeline.path('downloads.json'), {url: cache.key(url) for url in urls if url not in failed_urls})
+    return {'items': len(urls), 'processed': fetched, 'failed': len(failed)}
+
+
+def extract_text(pdf_path, text_path):
+    """Write the text of every page of ``pdf_path`` to ``text_path``."""
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        text = '\n'.join(page.extract_text() or '' for page in pdf.pages)
+    with open(text_path + '.tmp', 'w', encoding='utf-8') as output:
+        output.write(text)
+    os.replace(text_path + '.tmp', text_path)
+
+
+def run_extract(pipeline):
+    cache = get_cache()
+    downloads = _read_json(pipeline.path('downloads.json'))
+    os.makedirs(pipeline.path('text'), exist_ok=True)
+    text_paths = {url: os.path.join('text', key + '.txt') for url, key in downloads.items()}
+    # Texts are keyed like the PDF cache (URL and sfvrsn version), so only new or re-published reports are extracted
+    pending = [url for url, text in text_paths.items() if not os.path.exists(pipeline.path(text))]
+    # PDFs evicted from the cache since the download stage are fetched again first
+    cache.prefetch(pending, workers=pipeline.workers)
+
+    failed = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=pipeline.workers) as pool:
+            futures = {pool.submit(extract_text, cache.path(url), pipeline.path(text_paths[url])): url
+                       for url in pending}
+            for future, url in futures.items():
+                try:
+                    future.result()
+                except Exception as error:
+                    print(f"  extract failed: {url}: {error}")
+                    failed += 1
+
+    texts = {url: {'text': text, 'sha256': file_hash(pipeline.path(text))}
+             for url, text in text_paths.items() if os.path.exists(pipeline.path(text))}
+    _write_json(pipeline.path('texts.json'), texts)
+    return {'items': len(text_paths), 'processed': len(pending) - failed, 'failed': failed}
+
+
+@lru_cache(maxsize=None)
+def load_scorer(spec):
+    """The function named by a ``module:function`` scorer spec."""
+    module, _, function = spec.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def score_text(text_path, scorer):
+    """``(word_count, document_sentiment_score)`` of the text at ``text_path``."""
+    with open(text_path, encoding='utf-8') as source:
+        text = source.read()
+    return len(text.split()), float(load_scorer(scorer)(text))
+
+
+def vader_score(text):
+    """Default scorer: the VADER compound polarity of the whole report, from -1 to 1.
+
+    Needs ``nltk`` and its ``vader_lexicon`` data.
+    """
+    return _vader().polarity_scores(text)['compound']
+
+
+@lru_cache(maxsize=1)
+def _vader():
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+    return SentimentIntensityAnalyzer()
+
+
+def run_score(pipeline):
+    texts = _read_json(pipeline.path('texts.json'))
+    scores_path = pipeline.path('scores.parquet')
+    # Scores of texts this scorer has already seen are reused
+    known = {}
+    if os.path.exists(scores_path):
+        previous = pd.read_parquet(scores_path)
+        previous = previous[previous['scorer'] == pipeline.scorer]
+        known = dict(zip(previous['text_sha256'],
+                         zip(previous['word_count'], previous['document_sentiment_score'])))
+    pending = sorted({text['sha256']: url for url, text in texts.items() if text['sha256'] not in known}.items())
+
+    failed = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=pipeline.workers) as pool:
+            futures = {pool.submit(score_text, pipeline.path(texts[url]['text']), pipeline.scorer): (digest, url)
+                       for digest, url in pending}
+            for future, (digest, url) in futures.items():
+                try:
+                    known[digest] = future.result()
+                except Exception as error:
+                    print(f"  score failed: {url}: {error}")
+                    failed += 1
+
+    scored = sorted(url for url, text in texts.items() if text['sha256'] in known)
+    digests = [texts[url]['sha256'] for url in scored]
+    scores = pd.DataFrame({
+        'pdf_link': scored,
+        'text_sha256': digests,
+        'scorer': pipeline.scorer,
+        'word_count': [known[digest][0] for digest in digests],
+        'document_sentiment_score': [known[digest][1] for digest in digests],
+    })
+    scores.to_parquet(scores_path + '.tmp', engine='pyarrow', index=False)
+    os.replace(scores_path + '.tmp', scores_path)
+    return {'items': len(texts), 'processed': len(pending) - failed, 'failed': failed}
+
+
+def inspection_types(reports, current_path, overrides_path=None):
+    """Inspection Type of each scraped report.
+
+    Reports listed in the CSV at ``overrides_path`` get the type given there.
+    Other reports already in the current data file at ``current_path`` keep
+    their type. New reports are typed from their issuer audit client count
+    (annual above ``ANNUAL_INSPECTION_THRESHOLD``), or
+    ``UNKNOWN_INSPECTION_TYPE`` when the count is missing, as it is for most
+    US firms.
+    """
+    keys = report_keys(reports)
+    types = pd.Series(UNKNOWN_INSPECTION_TYPE, index=reports.index, dtype=object)
+    clients = pd.to_numeric(reports['Total Issuer Audit Clients'], errors='coerce')
+    types[clients.notna()] = clients[clients.notna()].gt(ANNUAL_INSPECTION_THRESHOLD).map(
+        {True: 'Annual', False: 'Triennial'})
+    sources = []
+    if os.path.exists(current_path):
+        current = pd.read_parquet(current_path, engine='pyarrow')
+        if 'Inspection Type' in current:
+            sources.append(current)
+    if overrides_path and os.path.exists(overrides_path):
+        sources.append(pd.read_csv(overrides_path, dtype=str))
+    # Later sources win: the overrides over the existing types, which win over the client counts
+    for source in sources:
+        source_types = source['Inspection Type'].astype(object).str.strip()
+        known = source_types.notna() & ~source_types.isin(['', UNKNOWN_INSPECTION_TYPE])
+        carried = keys.map(pd.Series(source_types.to_numpy(dtype=object), index=report_keys(source))[known.to_numpy()])
+        types = types.where(carried.isna().to_numpy(), carried.to_numpy())
+    return types.to_numpy(dtype=object)
+
+
+def run_transform(pipeline):
+    reports = pd.read_csv(pipeline.csv_path).rename(columns={'PDF Link': 'pdf_link'})
+    scores = pd.read_parquet(pipeline.path('scores.parquet'), columns=['pdf_link', 'word_count',
+                                                                        'document_sentiment_score'])
+    # The current data file is read for the existing types but is not a fingerprinted input, since it is also
+    # this stage's output
+    reports['Inspection Type'] = inspection_types(reports, pipeline.data_path, pipeline.inspection_types_path)
+    unknown = reports.loc[reports['Inspection Type'] == UNKNOWN_INSPECTION_TYPE, 'pdf_link']
+    for url in unknown:
+        print(f"  no inspection type: {url}")
+    if len(unknown):
+        # A warning rather than a failure: nothing but the overrides file can type these reports, and
+        # the stage reruns when that file changes
+        print(f"  {len(unknown)} reports published as {UNKNOWN_INSPECTION_TYPE!r}; "
+              f"set their types in {pipeline.inspection_types_path}")
+    df = reports.merge(scores, on='pdf_link', how='left', validate='many_to_one')
+    missing = int(df['document_sentiment_score'].isna().sum())
+    if missing:
+        print(f"  {missing} reports have no score")
+
+    df.to_parquet(pipeline.data_path + '.tmp', engine='pyarrow', compression='zstd', index=False)
+    if os.path.exists(pipeline.data_path) and file_hash(pipeline.data_path + '.tmp') == file_hash(pipeline.data_path):
+        # Unchanged: keep the existing file, and its modification time, so the startup snapshot stays valid
+        os.remove(pipeline.data_path + '.tmp')
+    else:
+        os.replace(pipeline.data_path + '.tmp', pipeline.data_path)
+    return {'items': len(df), 'processed': len(df)}
+
+
+def run_publish(pipeline):
+    build_snapshot(pipeline.data_path)
+    entry = snapshot_file(pipeline.data_path, note=f"pipeline run {pipeline.run_id}")
+    print(f"  dataset version {entry['id']}")
+    return {'items': entry['rows'], 'processed': entry['rows']}
+
+
+STAGES = [
+    Stage('scrape', run_scrape, outputs=lambda p: [p.csv_path], params=('scrape',),
+          # A scrape reads the live website, so it cannot be skipped based on its inputs
+          cacheable=lambda p: not p.scrape),
+    Stage('download', run_download, deps=['scrape'], inputs=lambda p: [p.csv_path],
+          outputs=lambda p: [p.path('downloads.json')]),
+    Stage('extract', run_extract, deps=['download'], inputs=lambda p: [p.path('downloads.json')],
+          outputs=lambda p: [p.path('texts.json')]),
+    Stage('score', run_score, deps=['extract'], inputs=lambda p: [p.path('texts.json')],
+          outputs=lambda p: [p.path('scores.parquet')], params=('scorer',)),
+    Stage('transform', run_transform, deps=['scrape', 'score'],
+          inputs=lambda p: [p.csv_path, p.path('scores.parquet'), p.inspection_types_path],
+          outputs=lambda p: [p.data_path], version=3),
+    Stage('publish', run_publish, deps=['transform'], inputs=lambda p: [p.data_path],
+          outputs=lambda p: [p.data_path, snapshot_path(p.data_path)],
+          # data_layer ignores a startup snapshot older than its data file, so an older one is rebuilt
+          cacheable=lambda p: (os.path.exists(snapshot_path(p.data_path)) and os.path.exists(p.data_path)
+                               and os.path.getmtime(snapshot_path(p.data_path)) >= os.path.getmtime(p.data_path))),
+]
+
+
+class Pipeline:
+    """Runs ``STAGES`` in dependency order, skipping the stages whose inputs are unchanged."""
+
+    def __init__(self, stages=STAGES, work_dir=WORK_DIR, csv_path=REPORTS_CSV, data_path=DATA_PATH,
+                 workers=os.cpu_count() or 4, scorer=DEFAULT_SCORER, scrape=False, force=False,
+                 inspection_types_path=INSPECTION_TYPES_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.work_dir = work_dir
+        self.csv_path = csv_path
+        self.data_path = data_path
+        self.inspection_types_path = inspection_types_path
+        self.workers = workers
+        self.scorer = scorer
+        self.scrape = scrape
+        self.force = force
+        self.run_id = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        self._state_lock = threading.Lock()
+        os.makedirs(work_dir, exist_ok=True)
+        self.state = _read_json(self.path('state.json')) if os.path.exists(self.path('state.json')) else {}
+
+    def path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def required(self, targets=None):
+        """Names of ``targets`` (default: every stage) and all their dependencies, in dependency order."""
+        ordered = []
+
+        def visit(name):
+            if name not in ordered:
+                for dep in self.stages[name].deps:
+                    visit(dep)
+                ordered.append(name)
+
+        for name in targets or self.stages:
+            visit(name)
+        return ordered
+
+    def fingerprint(self, stage):
+        """Hash of what determines a stage's output: its code version, parameters and input files."""
+        return hashlib.sha256(json.dumps({
+            'stage': stage.name,
+            'version': stage.version,
+            'params': {name: getattr(self, name) for name in stage.params},
+            'inputs': {path: file_hash(path) if os.path.exists(path) else None for path in stage.inputs(self)},
+        }, sort_keys=True).encode()).hexdigest()
+
+    def is_current(self, stage):
+        """Whether the stage's last successful run had the same fingerprint and its outputs are untouched."""
+        previous = self.state.get(stage.name)
+        return (stage.cacheable(self) and previous is not None
+                and previous['fingerprint'] == self.fingerprint(stage)
+                and all(os.path.exists(path) and file_hash(path) == digest
+                        for path, digest in previous['outputs'].items()))
+
+    def run_stage(self, stage):
+        start = time.perf_counter()
+        if not self.force and self.is_current(stage):
+            return {'stage': stage.name, 'status': 'skipped', 'seconds': time.perf_counter() - start,
+                    'items': self.state[stage.name]['items'], 'processed': 0, 'failed': 0}
+        fingerprint = self.fingerprint(stage)
+        result = {'processed': 0, 'failed': 0, **stage.run(self)}
+        if not result['failed']:
+            # A stage with failed items is not recorded, so the next run retries them
+            with self._state_lock:
+                self.state[stage.name] = {
+                    'fingerprint': fingerprint,
+                    'outputs': {path: file_hash(path) for path in stage.outputs(self)},
+                    'items': result['items'],
+                    'run': self.run_id,
+                }
+                _write_json(self.path('state.json'), self.state)
+        return {'stage': stage.name, 'status': 'ran', 'seconds': time.perf_counter() - start, **result}
+
+    def run(self, targets=None):
+        """Run ``targets`` and their dependencies; returns one timing record per stage.
+
+        Stages start as soon as their dependencies have finished. After a
+        failure no new stages start and the error is raised once the running
+        ones are done.
+        """
+        pending = self.required(targets)
+        results, running, error = {}, {}, None
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            while pending or running:
+                if error is None:
+                    for name in [name for name in pending if all(dep in results for dep in self.stages[name].deps)]:
+                        print(f"{name}...")
+                        running[pool.submit(self.run_stage, self.stages[name])] = name
+                        pending.remove(name)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as stage_error:
+                        error = error or stage_error
+                        results[name] = {'stage': name, 'status': 'failed', 'items': 0, 'processed': 0,
+                                         'failed': 0, 'seconds': None, 'error': repr(stage_error)}
+
+        records = [results[name] for name in self.required(targets) if name in results]
+        for record in records:
+            seconds = record['seconds']
+            record['items_per_second'] = record['processed'] / seconds if seconds and record['processed'] else None
+        with open(self.path('runs.jsonl'), 'a') as log:
+            log.write(json.dumps({'run': self.run_id, 'seconds': time.perf_counter() - start,
+                                  'workers': self.workers, 'stages': records}) + '\n')
+        if error is not None:
+            raise error
+        return records
+
+
+def format_records(records):
+    lines = [f"{'stage':<10} {'status':<8} {'seconds':>9} {'items':>7} {'processed':>9} {'failed':>6} {'items/s':>9}"]
+    for record in records:
+        seconds = '' if record['seconds'] is None else f"{record['seconds']:.2f}"
+        rate = '' if record.get('items_per_second') is None else f"{record['items_per_second']:.1f}"
+        lines.append(f"{record['stage']:<10} {record['status']:<8} {seconds:>9} {record['items']:>7} "
+                     f"{record['processed']:>9} {record['failed']:>6} {rate:>9}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PCAOB data refresh pipeline')
+    parser.add_argument('--work-dir', default=WORK_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='run the pipeline (or the given stages and their dependencies)')
+    run_parser.add_argument('stages', nargs='*', metavar='stage', help=', '.join(stage.name for stage in STAGES))
+    run_parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    run_parser.add_argument('--scorer', default=DEFAULT_SCORER, help='module:function sentiment scorer')
+    run_parser.add_argument('--scrape', action='store_true', help=f're-scrape the report list with {SCRAPE_NOTEBOOK}')
+    run_parser.add_argument('--force', action='store_true', help='rerun stages even if their inputs are unchanged')
+    run_parser.add_argument('--inspection-types', default=INSPECTION_TYPES_PATH,
+                            help='CSV of "PDF Link,Inspection Type" overrides')
+    status_parser = subparsers.add_parser('status', help='show which stages are up to date')
+    status_parser.add_argument('--scorer', default=DEFAULT_SCORER)
+    status_parser.add_argument('--inspection-types', default=INSPECTION_TYPES_PATH)
+    history_parser = subparsers.add_parser('history', help='show the timings of past runs')
+    history_parser.add_argument('--last', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        unknown = [name for name in args.stages if name not in {stage.name for stage in STAGES}]
+        if unknown:
+            parser.error(f"unknown stage: {', '.join(unknown)}")
+        pipeline = Pipeline(work_dir=args.work_dir, workers=args.workers, scorer=args.scorer,
+                            scrape=args.scrape, force=args.force, inspection_types_path=args.inspection_types)
+        records = pipeline.run(args.stages or None)
+        print(format_records(records))
+    elif args.command == 'status':
+        pipeline = Pipeline(work_dir=args.work_dir, scorer=args.scorer, inspection_types_path=args.inspection_types)
+        for stage in pipeline.stages.values():
+            previous = pipeline.state.get(stage.name)
+            status = 'up to date' if pipeline.is_current(stage) else 'stale' if previous else 'never run'
+            print(f"{stage.name:<10} {status:<11} {previous['run'] if previous else ''}")
+    elif args.command == 'history':
+        log_path = os.path.join(args.work_dir, 'runs.jsonl')
+        if not os.path.exists(log_path):
+            parser.exit(0, "no runs recorded\n")
+        with open(log_path) as log:
+            runs = [json.loads(line) for line in log][-args.last:]
+        for run in runs:
+            print(f"run {run['run']}: {run['seconds']:.1f} s, {run['workers']} workers")
+            print(format_records(run['stages']))
+            print()
@@ -0,0 +1,209 @@
+"""Sentiment vs. deficiency statistics for the PCAOB dashboard and API.
+
+Computes Pearson/Spearman correlations between ``document_sentiment_score`` and
+``Part I.A Deficiency Rate``, bootstrap confidence intervals for both, and
+per-company and per-firm year-over-year trend slopes of the deficiency rate.
+Per-firm trends group on the resolved ``Firm ID`` so a firm's reports filed
+under different spellings form one trend line. Everything is
+vectorized in NumPy: bootstrap resamples are drawn and scored in batches
+rather than one at a time, and the per-company slopes come from grouped sums.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SENTIMENT_COLUMN = 'document_sentiment_score'
+DEFICIENCY_COLUMN = 'Part I.A Deficiency Rate'
+YEAR_COLUMN = 'Inspection Year'
+COMPANY_COLUMN = 'Company'
+FIRM_ID_COLUMN = 'Firm ID'
+FIRM_NAME_COLUMN = 'Firm Name'
+
+# Number of cached filter selections kept in memory
+STATS_CACHE_SIZE = 64
+# Resampled values drawn per bootstrap batch (resamples x rows), bounding its memory use
+BOOTSTRAP_BATCH_ELEMENTS = 2_000_000
+_stats_cache = OrderedDict()
+# Streamlit sessions and the API's threadpool share the cache
+_stats_cache_lock = threading.Lock()
+
+
+def _rowwise_pearson(x, y):
+    # Pearson correlation of each row of x against the same row of y
+    x = x - x.mean(axis=-1, keepdims=True)
+    y = y - y.mean(axis=-1, keepdims=True)
+    denom = np.sqrt((x * x).sum(axis=-1) * (y * y).sum(axis=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denom > 0, (x * y).sum(axis=-1) / denom, np.nan)
+
+
+def _rowwise_rank(values):
+    # Average ranks (ties share the mean rank) of each row, computed for all
+    # rows at once by shifting every row into its own disjoint value range.
+    values = np.atleast_2d(values).astype(float)
+    n_rows, n_cols = values.shape
+    lo = values.min()
+    span = values.max() - lo + 1.0
+    shifted = (values - lo) + span * np.arange(n_rows)[:, None]
+    flat = np.sort(shifted, axis=None)
+    left = np.searchsorted(flat, shifted, side='left')
+    right = np.searchsorted(flat, shifted, side='right')
+    offset = n_cols * np.arange(n_rows)[:, None]
+    return (left + right - 1) / 2.0 - offset + 1.0
+
+
+def pearson(x, y):
+    """Pearson correlation coefficient of two 1-D arrays."""
+    return float(_rowwise_pearson(np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+
+
+def spearman(x, y):
+    """Spearman rank correlation coefficient of two 1-D arrays."""
+    return float(_rowwise_pearson(_rowwise_rank(x)[0], _rowwise_rank(y)[0]))
+
+
+def bootstrap_ci(x, y, n_resamples=2000, confidence=0.95, batch_size=None, seed=0):
+    """Percentile bootstrap confidence intervals for Pearson and Spearman.
+
+    Resample indices are drawn ``batch_size`` rows at a time and every row of a
+    batch is scored in one vectorized pass. By default the batch holds about
+    ``BOOTSTRAP_BATCH_ELEMENTS`` values, so memory stays flat as ``n`` grows.
+    Returns a dict mapping ``'pearson'`` and ``'spearman'`` to ``(low, high)``
+    tuples.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n < 3:
+        return {'pearson': (np.nan, np.nan), 'spearman': (np.nan, np.nan)}
+
+    if batch_size is None:
+        batch_size = max(1, BOOTSTRAP_BATCH_ELEMENTS // n)
+    rng = np.random.default_rng(seed)
+    pearson_draws = np.empty(n_resamples)
+    spearman_draws = np.empty(n_resamples)
+    for start in range(0, n_resamples, batch_size):
+        stop = min(start + batch_size, n_resamples)
+        idx = rng.integers(0, n, size=(stop - start, n))
+        xb, yb = x[idx], y[idx]
+        pearson_draws[start:stop] = _rowwise_pearson(xb, yb)
+        spearman_draws[start:stop] = _rowwise_pearson(_rowwise_rank(xb), _rowwise_rank(yb))
+
+    tail = (1.0 - confidence) / 2.0 * 100
+    bounds = [tail, 100 - tail]
+    return {
+        'pearson': tuple(float(v) for v in np.nanpercentile(pearson_draws, bounds)),
+        'spearman': tuple(float(v) for v in np.nanpercentile(spearman_draws, bounds)),
+    }
+
+
+def trend_slopes(years, rates, groups):
+    """Least-squares slope of ``rates`` against ``years`` for each group.
+
+    Returns ``(labels, slopes, counts)`` where each slope is the average change
+    in deficiency rate (percentage points) per inspection year. Groups with
+    fewer than two distinct years get a NaN slope.
+    """
+    years = np.asarray(years, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+
+    counts = np.bincount(codes, minlength=len(labels)).astype(float)
+    sum_x = np.bincount(codes, years, minlength=len(labels))
+    sum_y = np.bincount(codes, rates, minlength=len(labels))
+    sum_xx = np.bincount(codes, years * years, minlength=len(labels))
+    sum_xy = np.bincount(codes, years * rates, minlength=len(labels))
+
+    var_x = sum_xx - sum_x * sum_x / counts
+    cov_xy = sum_xy - sum_x * sum_y / counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = np.where(var_x > 1e-12, cov_xy / var_x, np.nan)
+    return labels, slopes, counts.astype(int)
+
+
+def compute_statistics(df, n_resamples=2000, confidence=0.95, seed=0):
+    """Correlation, bootstrap CI and trend statistics for a filtered frame."""
+    data = df[[SENTIMENT_COLUMN, DEFICIENCY_COLUMN, YEAR_COLUMN, COMPANY_COLUMN]].dropna()
+    sentiment = data[SENTIMENT_COLUMN].to_numpy(dtype=float)
+    deficiency = data[DEFICIENCY_COLUMN].to_numpy(dtype=float)
+
+    if len(data) >= 3:
+        correlations = {'pearson': pearson(sentiment, deficiency),
+                        'spearman': spearman(sentiment, deficiency)}
+    else:
+        correlations = {'pearson': np.nan, 'spearman': np.nan}
+    intervals = bootstrap_ci(sentiment, deficiency, n_resamples=n_resamples,
+                             confidence=confidence, seed=seed)
+
+    years = data[YEAR_COLUMN].astype(int).to_numpy()
+    labels, slopes, counts = trend_slopes(years, deficiency, data[COMPANY_COLUMN].to_numpy())
+    trends = [
+        {'company': str(label), 'slope_per_year': None if np.isnan(slope) else float(slope),
+         'reports': int(count)}
+        for label, slope, count in zip(labels, slopes, counts)
+    ]
+
+    firm_trends = []
+    if FIRM_ID_COLUMN in df:
+        firms = df.loc[data.index, [FIRM_ID_COLUMN, FIRM_NAME_COLUMN]]
+        firm_names = firms.groupby(FIRM_ID_COLUMN)[FIRM_NAME_COLUMN].first()
+        labels, slopes, counts = trend_slopes(years, deficiency, firms[FIRM_ID_COLUMN].to_numpy())
+        firm_trends = [
+            {'firm_id': str(label), 'firm': str(firm_names[label]),
+             'slope_per_year': None if np.isnan(slope) else float(slope), 'reports': int(count)}
+            for label, slope, count in zip(labels, slopes, counts)
+        ]
+
+    return {
+        'n': int(len(data)),
+        'confidence': confidence,
+        'pearson': _nan_to_none(correlations['pearson']),
+        'pearson_ci': [_nan_to_none(v) for v in intervals['pearson']],
+        'spearman': _nan_to_none(correlations['spearman']),
+        'spearman_ci': [_nan_to_none(v) for v in intervals['spearman']],
+        'trends': trends,
+        'firm_trends': firm_trends,
+    }
+
+
+def cached_statistics(filter_key, df, data_token, **kwargs):
+    """Return ``compute_statistics(df)``, memoized by a hashable filter key.
+
+    ``filter_key`` should capture every selection used to produce ``df`` so
+    that identical sidebar/API selections reuse the earlier result, and
+    ``data_token`` identifies the loaded data (``CompiledFilter.data_token``)
+    so a reloaded data file does not return statistics of the old one.
+    """
+    key = (data_token, filter_key, tuple(sorted(kwargs.items())))
+    with _stats_cache_lock:
+        if key in _stats_cache:
+            _stats_cache.move_to_end(key)
+            return _stats_cache[key]
+    # Computed outside the lock so other selections are not held up; two threads missing the same
+    # key at once both compute it and the later result is kept
+    result = compute_statistics(df, **kwargs)
+    with _stats_cache_lock:
+        _stats_cache[key] = result
+        _stats_cache.move_to_end(key)
+        while len(_stats_cache) > STATS_CACHE_SIZE:
+            _stats_cache.popitem(last=False)
+    return result
+
+
+def make_filter_key(*selections):
+    """Build a hashable cache key from sidebar/API filter selections."""
+    def freeze(value):
+        if isinstance(value, (set, frozenset)):
+            return tuple(sorted(freeze(v) for v in value))
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+    return tuple(freeze(s) for s in selections)
+
+
+def _nan_to_none(value):
+    # JSON has no NaN, so undefined statistics are reported as null
+    return None if value is None or np.isnan(value) else float(value)
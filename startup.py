@@ -0,0 +1,66 @@
+"""Cold-start helpers for the Streamlit entry points.
+
+``lazy_import`` defers heavy plotting libraries until the first chart that
+uses them, so the sidebar and scorecards reach the browser before plotly and
+altair have been imported. ``log_first_render`` records how long a script run
+took to reach its first data-backed render, flagging the first run in a
+process as the cold start.
+"""
+import importlib
+import logging
+import sys
+import time
+
+logger = logging.getLogger('pcaob.startup')
+if not logger.handlers:
+    # Streamlit does not configure the root logger, so give ours a handler for the dyno logs
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_lazy_modules = {}
+_first_render_logged = False
+
+
+class LazyModule:
+    """Module proxy that imports ``name`` on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            already_imported = self._name in sys.modules
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            if not already_imported:
+                logger.info("imported %s in %.1f ms", self._name, (time.perf_counter() - start) * 1000)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    """Return a proxy for module ``name`` that is imported when first used.
+
+    Proxies are shared across script reruns, so the import happens (and is
+    logged) once per process.
+    """
+    if name not in _lazy_modules:
+        _lazy_modules[name] = LazyModule(name)
+    return _lazy_modules[name]
+
+
+def log_first_render(run_start):
+    """Log time-to-first-render, measured from ``run_start`` (a ``perf_counter`` value).
+
+    The first run in a process is the cold start and is logged at INFO; later
+    reruns are logged at DEBUG.
+    """
+    global _first_render_logged
+    elapsed_ms = (time.perf_counter() - run_start) * 1000
+    if not _first_render_logged:
+        _first_render_logged = True
+        logger.info("cold start: first render after %.1f ms", elapsed_ms)
+    else:
+        logger.debug("rerun: first render after %.1f ms", elapsed_ms)
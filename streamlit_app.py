@@ -1,7 +1,8 @@
 import streamlit as st
-import pandas as pd
 import altair as alt
 
+from data_layer import load_data, get_filter, key_metrics, mean_word_count_by_company
+
 # 3.2 Page configuration
 st.set_page_config(
     page_title="PCAOB Inspection Dashboard",
@@ -11,15 +12,10 @@ st.set_page_config(
 )
 
 # 3.3 Load data
-# Load your CSV data
-df = pd.read_csv('final_transformed_data.csv')
-
-# Preprocess the data
-df['Inspection Year'] = df['Inspection Year'].astype(str)
-
-# Round float values to the nearest thousandths
-float_columns = df.select_dtypes(include=['float64']).columns
-df[float_columns] = df[float_columns].round(3)
+# Load your CSV data (loading and preprocessing are shared with the other dashboards through data_layer)
+DATA_PATH = 'final_transformed_data.csv'
+df = load_data(DATA_PATH)
+data_filter = get_filter(DATA_PATH)
 
 # 3.4 Add a sidebar
 with st.sidebar:
@@ -39,23 +35,16 @@ with st.sidebar:
     selected_word_count = st.slider('Select word count range', min_value=word_count_min, max_value=word_count_max, value=(word_count_min, word_count_max))
 
 # Filter the dataframe based on sidebar selections
-df_filtered = df.copy()
-
-if selected_years:
-    df_filtered = df_filtered[df_filtered['Inspection Year'].isin(selected_years)]
-
-if selected_countries:
-    df_filtered = df_filtered[df_filtered['Country'].isin(selected_countries)]
-
-if selected_companies:
-    df_filtered = df_filtered[df_filtered['Company'].isin(selected_companies)]
-
-df_filtered = df_filtered[(df_filtered['word_count'] >= selected_word_count[0]) & (df_filtered['word_count'] <= selected_word_count[1])]
+df_filtered = data_filter.apply(
+    isin={'Inspection Year': selected_years, 'Country': selected_countries, 'Company': selected_companies},
+    ranges={'word_count': selected_word_count}
+)
 
 # 3.4b Calculate key metrics
-total_clients = df_filtered['Total Issuer Audit Clients'].sum()
-avg_sentiment = df_filtered['sentiment_avg'].mean().round(2)
-avg_word_count = df_filtered['word_count'].mean().round(2)
+metrics = key_metrics(df_filtered, sentiment_column='sentiment_avg')
+total_clients = metrics['total_clients']
+avg_sentiment = metrics['avg_sentiment'].round(2)
+avg_word_count = metrics['avg_word_count'].round(2)
 
 # 3.4c Display scorecards
 st.title('PCAOB Inspection Data Dashboard')
@@ -94,7 +83,7 @@ def make_line_chart(input_df):
 # Word count plot
 def make_word_count_plot(input_df):
     # Calculate the average word count rounded to three decimal places
-    input_df['mean_word_count'] = input_df.groupby('Company')['word_count'].transform('mean').round(2)
+    input_df['mean_word_count'] = mean_word_count_by_company(input_df)
     
     word_count_plot = alt.Chart(input_df).mark_bar().encode(
         x=alt.X('mean_word_count:Q', title='Average Word Count', axis=alt.Axis(format=".2f")),  # Ensure x-axis values are rounded to three decimal places